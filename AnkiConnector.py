@@ -1,22 +1,100 @@
 import requests
-import base64
+import hashlib
+import json
 import os
+from anki_utils import deck_notes_query, deck_query, front_hash, get_transport, iter_notes_info
+
+MEDIA_PREFIX = 'grammarpt_'
+MEDIA_INDEX_PATH = os.path.expanduser('~/.cache/grammarpt/anki_media_index.json')
 
 def notify(text): # This notify is within AnkiConnector, may differ from the main script's
     print(f"AnkiConnector Notify: {text}") # Changed to print for less dependency during testing
     # msg = "notify-send ' ' '"+text+"'" # Original line, can be restored later
     # os.system(msg)
 
+def media_filename_for(path):
+    """Content-addressed media filename: MEDIA_PREFIX + sha256 of the file + original extension."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    extension = os.path.splitext(path)[1].lower() or '.jpg'
+    return MEDIA_PREFIX + digest.hexdigest()[:32] + extension
+
+class MediaIndex:
+    """Content-addressed media filenames Anki already has, persisted between runs.
+
+    The first use on a machine seeds it from getMediaFilesNames; after that uploads are
+    recorded locally so re-used images cost no AnkiConnect call at all.
+    """
+
+    def __init__(self, path=MEDIA_INDEX_PATH):
+        self.path = path
+        self.filenames = None
+        try:
+            with open(path, 'r') as f:
+                self.filenames = set(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def seeded(self):
+        return self.filenames is not None
+
+    def seed(self, filenames):
+        self.filenames = {name for name in filenames or [] if name.startswith(MEDIA_PREFIX)}
+        self.save()
+
+    def __contains__(self, filename):
+        return self.seeded and filename in self.filenames
+
+    def add(self, filename):
+        if self.filenames is None:
+            self.filenames = set()
+        self.filenames.add(filename)
+        self.save()
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(sorted(self.filenames), f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save media index {self.path}: {e}")
+
+_media_index = None
+
+def get_media_index():
+    """Return the process-wide MediaIndex, loading it on first use."""
+    global _media_index
+    if _media_index is None:
+        _media_index = MediaIndex()
+    return _media_index
+
+def _note_ids_in_notes_info(notes_info):
+    """Return the set of noteIds in a notesInfo result (missing notes come back as {}) or a findNotes id list."""
+    note_ids = set()
+    for note in notes_info or []:
+        if isinstance(note, dict):
+            if note.get('noteId') is not None:
+                note_ids.add(note['noteId'])
+        elif note is not None:
+            note_ids.add(note)
+    return note_ids
+
 class AnkiConnector:
-    def __init__(self, deck_name='Default', note_type='Basic', allow_duplicate=False, back_image=None):
+    def __init__(self, deck_name='Default', note_type='Basic', allow_duplicate=False, back_image=None, transport=None):
         self.deck_name = deck_name
         self.note_type = note_type
         self.allow_duplicate = allow_duplicate
         self.back_image = back_image
+        self.transport = transport or get_transport()
 
 
-    def add_card(self, front, back, source):
-        # Create the note
+    def _build_note(self, front, back, source, image_filename=None):
+        """Build an AnkiConnect note dict, appending the image and source to the back."""
         note = {
             'deckName': self.deck_name,
             'modelName': self.note_type,
@@ -28,108 +106,377 @@ class AnkiConnector:
                 'allowDuplicate': self.allow_duplicate
             },
             'tags': []
-        }      
-        
+        }
+
         formatted_source = '<br><br>source: <a href="'+source+'">'+source+'</a>' if source else ''
-        # Add the back image to the media folder if provided
-        if self.back_image:
-            filename = os.path.splitext(self.back_image)[0]
-            filename = filename.split('/')[-1]
-            print(self.back_image)
-            with open(self.back_image, 'rb') as f:
-                image_data = f.read()
-            base64_data = base64.b64encode(image_data).decode('utf-8')
-            requests.post('http://localhost:8765', json={
-                'action': 'storeMediaFile',
-                'version': 6,
-                'params': {
-                    'filename': filename+'.jpg',
-                    'data': base64_data
-                }
-            })
+        if image_filename:
             # Add the image tag to the back field
-            note['fields']['Back'] += '<br><img src="'+filename+'.jpg">'+formatted_source
-        else:
-            note['fields']['Back'] += formatted_source
+            note['fields']['Back'] += '<br><img src="'+image_filename+'">'
+        note['fields']['Back'] += formatted_source
+        return note
+
+    def _back_image_media_params(self):
+        """Return storeMediaFile params for self.back_image.
+
+        Anki reads the file itself via 'path', so the image never goes through a base64 string here.
+        """
+        print(self.back_image)
+        return {
+            'filename': media_filename_for(self.back_image),
+            'path': os.path.abspath(self.back_image)
+        }
+
+    def _back_image_upload(self):
+        """Return (filename, storeMediaFile params) for self.back_image; params is None if Anki already has it."""
+        params = self._back_image_media_params()
+        media_index = get_media_index()
+        if not media_index.seeded:
+            try:
+                media_index.seed(self.transport.request('getMediaFilesNames', {'pattern': MEDIA_PREFIX + '*'}))
+            except (requests.RequestException, ValueError, RuntimeError) as e:
+                print(f"Could not list Anki media files: {e}")
+        if params['filename'] in media_index:
+            print(f"Media {params['filename']} already in Anki, skipping upload")
+            return params['filename'], None
+        return params['filename'], params
+
+    def _store_back_image(self):
+        """Upload self.back_image to Anki's media folder unless Anki already has it; return the filename."""
+        filename, params = self._back_image_upload()
+        if params:
+            self.transport.request('storeMediaFile', params, timeout=30)
+            get_media_index().add(filename)
+        return filename
+
+    def _add_card_actions(self, note, media_params, verify):
+        """Actions for one 'multi' request: optional media upload, addNote, optional verification."""
+        actions = []
+        if media_params:
+            actions.append({'action': 'storeMediaFile', 'version': 6, 'params': media_params})
+        actions.append({'action': 'addNote', 'version': 6, 'params': {'note': note}})
+        if verify:
+            # The new noteId is not known inside the request, so verify by listing notes added
+            # to the deck today; the id returned by addNote must be among them.
+            actions.append({'action': 'findNotes', 'version': 6, 'params': {'query': deck_query(self.deck_name) + ' added:1'}})
+        return actions
+
+    def add_card(self, front, back, source, verify=True):
+        """Add one card and return True/False.
+
+        The media upload, addNote and verification are sent as one 'multi' request, so a card
+        costs a single round-trip. verify=False skips verification for latency-sensitive callers.
+        """
+        try:
+            image_filename, media_params = self._back_image_upload() if self.back_image else (None, None)
+        except OSError as e:
+            error_message = f"Could not read back image: {e}"
+            notify(error_message)
+            print(error_message)
+            return False
+        note = self._build_note(front, back, source, image_filename)
+        actions = self._add_card_actions(note, media_params, verify)
 
-        # Add the note to the deck
-        response = requests.post('http://localhost:8765', json={
-            'action': 'addNote',
-            'version': 6,
-            'params': {
-                'note': note
-            }
-        })
-        
         try:
-            response_json = response.json()
-        except ValueError: # JSONDecodeError in Python 3.5+
-            notify(f"AnkiConnect returned non-JSON response: {response.text}")
-            print(f"AnkiConnect returned non-JSON response: {response.text}")
-            with open('response.txt', 'w') as f:
-                f.write(f"Non-JSON response: {response.text}")
+            response_json = self.transport.invoke('multi', {'actions': actions}, timeout=30)
+        except (requests.RequestException, ValueError) as e:
+            error_message = f"AnkiConnect request failed: {e}"
+            notify(error_message)
+            print(error_message)
+            return False
+        return self._handle_add_card_results(response_json, media_params, verify)
+
+    def _handle_add_card_results(self, response_json, media_params, verify):
+        """Unpack the per-action results of add_card's 'multi' request into True/False."""
+        if response_json.get('error'):
+            error_message = f"AnkiConnect API error: {response_json.get('error')}"
+            notify(error_message)
+            print(error_message)
+            return False
+        action_results = list(response_json.get('result') or [])
+        expected = len(self._add_card_actions({}, media_params, verify))
+        if len(action_results) != expected:
+            error_message = f"AnkiConnect returned {len(action_results)} results for {expected} actions: {json.dumps(response_json)}"
+            notify(error_message)
+            print(error_message)
             return False
 
-        with open('response.txt', 'w') as f: # Log the full JSON response
-            f.write(response.text) # response.text is already a string
+        if media_params:
+            media_result = action_results.pop(0)
+            if media_result.get('error'):
+                error_message = f"Could not store back image: {media_result.get('error')}"
+                notify(error_message)
+                print(error_message)
+                return False
+            get_media_index().add(media_params['filename'])
+
+        noteid = self._note_id_from_add_response(action_results.pop(0))
+        if noteid is None:
+            return False
+        if not verify:
+            notify('Card created (not verified).')
+            return True
+        return self._check_verification_response(noteid, action_results.pop(0))
+
+    def _note_id_from_add_response(self, response_json):
+        """Return the int noteId from an addNote response, or None after reporting why it failed."""
+        response_text = json.dumps(response_json)
 
         api_error = response_json.get('error')
         if api_error:
             error_message = f"AnkiConnect API error: {api_error}"
             notify(error_message)
             print(error_message)
-            return False # Card creation failed due to API error
+            return None # Card creation failed due to API error
 
         noteid = response_json.get('result')
         if noteid is None:
-            error_message = f"AnkiConnect response missing 'result' (noteId): {response.text}"
+            error_message = f"AnkiConnect response missing 'result' (noteId): {response_text}"
             notify(error_message)
             print(error_message)
-            return False # Card creation failed, no noteId
+            return None # Card creation failed, no noteId
 
         try:
-            return self.verify_card_created(int(noteid))
+            return int(noteid)
         except ValueError:
             error_message = f"AnkiConnect returned non-integer noteId: {noteid}"
             notify(error_message)
             print(error_message)
-            return False
+            return None
 
     def verify_card_created(self, note_id):
         #notify('verifying card creation')
-        response = requests.post('http://localhost:8765', json={
-            'action': 'notesInfo',
+        try:
+            response_json = self.transport.invoke('notesInfo', {'notes': [note_id]})
+        except (requests.RequestException, ValueError) as e:
+            notify(f"Verification request failed: {e}")
+            print(f"Verification request failed: {e}")
+            return False
+        return self._check_verification_response(note_id, response_json)
+
+    def _check_verification_response(self, note_id, response_json):
+        if response_json.get('error'):
+            notify(f"Verification error: {response_json.get('error')}")
+            print(f"Verification error: {response_json.get('error')}")
+            return False
+        if note_id in _note_ids_in_notes_info(response_json.get('result')):
+            notify('Card created successfully (verified).')
+            return True
+        notify(f"Card verification failed, noteId {note_id} not found in notesInfo response: {json.dumps(response_json)}")
+        return False
+
+    def verify_cards_created(self, note_ids):
+        """Confirm many notes exist with a single notesInfo call.
+
+        Returns a summary dict {'verified': [ids], 'missing': [ids], 'error': str or None}.
+        """
+        note_ids = [int(note_id) for note_id in note_ids]
+        if not note_ids:
+            return {'verified': [], 'missing': [], 'error': None}
+        try:
+            response_json = self.transport.invoke('notesInfo', {'notes': note_ids}, timeout=60)
+        except (requests.RequestException, ValueError) as e:
+            response_json = {'error': f"Verification request failed: {e}"}
+        if response_json.get('error'):
+            print(f"Verification error: {response_json.get('error')}")
+            return {'verified': [], 'missing': note_ids, 'error': str(response_json.get('error'))}
+        found = _note_ids_in_notes_info(response_json.get('result'))
+        return {
+            'verified': [note_id for note_id in note_ids if note_id in found],
+            'missing': [note_id for note_id in note_ids if note_id not in found],
+            'error': None
+        }
+
+    def can_add_cards(self, cards):
+        """Check which cards Anki would accept, with one canAddNotesWithErrorDetail call.
+
+        Returns a list aligned with cards, each entry {'canAdd': bool, 'error': str or None},
+        or None if the check itself failed (e.g. an AnkiConnect version without this action).
+        """
+        if not cards:
+            return []
+        notes = [self._build_note(card['front'], card['back'], card.get('source', '')) for card in cards]
+        try:
+            response_json = self.transport.invoke('canAddNotesWithErrorDetail', {'notes': notes}, timeout=60)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Preflight request failed: {e}")
+            return None
+        if response_json.get('error'):
+            print(f"Preflight error: {response_json.get('error')}")
+            return None
+        results = response_json.get('result') or []
+        if len(results) != len(cards):
+            print(f"Preflight returned {len(results)} results for {len(cards)} cards, ignoring it")
+            return None
+        return [{'canAdd': bool(r.get('canAdd')), 'error': r.get('error')} for r in results]
+
+    def _run_batched(self, actions, batch_size):
+        """Send actions as 'multi' requests of batch_size actions each.
+
+        Returns a list of (result, error) tuples aligned with actions; a failed request
+        marks every action in its chunk with the request's error.
+        """
+        outcomes = []
+        for start in range(0, len(actions), batch_size):
+            chunk = actions[start:start + batch_size]
+            try:
+                # Allow a generous timeout: a large chunk is one long request
+                response_json = self.transport.invoke('multi', {'actions': chunk}, timeout=60)
+            except (requests.RequestException, ValueError) as e:
+                error_message = f"AnkiConnect batch request failed: {e}"
+                print(error_message)
+                outcomes.extend((None, error_message) for _ in chunk)
+                continue
+
+            if response_json.get('error'):
+                error_message = f"AnkiConnect API error: {response_json.get('error')}"
+                print(error_message)
+                outcomes.extend((None, error_message) for _ in chunk)
+                continue
+
+            for action_result in response_json.get('result') or []:
+                outcomes.append((action_result.get('result'), action_result.get('error')))
+            # Guard against a short result list so the output stays aligned with actions
+            while len(outcomes) < start + len(chunk):
+                outcomes.append((None, 'AnkiConnect returned no result for this card'))
+        return outcomes
+
+    def add_cards(self, cards, batch_size=50, verify=False, duplicate_scope=None):
+        """Add many cards with one AnkiConnect round-trip per chunk of batch_size cards.
+
+        cards is a list of dicts with 'front', 'back' and optional 'source' keys.
+        Returns a list aligned with cards, each entry {'note_id': int or None, 'error': str or None}.
+        With verify=True all created notes are confirmed by one verify_cards_created call at the
+        end of the run, and each entry also gets a 'verified' bool.
+        duplicate_scope='deck' limits Anki's duplicate check to the target deck (by default it
+        covers the whole collection), as in upsert_cards.
+        Each chunk is sent as a single 'multi' request of 'addNote' actions rather than one
+        'addNotes' call, because addNotes reports failures without saying which note they belong to.
+        """
+        image_filename = self._store_back_image() if self.back_image else None
+        notes = [self._build_note(card['front'], card['back'], card.get('source', ''), image_filename) for card in cards]
+        if duplicate_scope:
+            for note in notes:
+                note['options']['duplicateScope'] = duplicate_scope
+        actions = [{'action': 'addNote', 'version': 6, 'params': {'note': note}} for note in notes]
+        results = []
+        for result, error in self._run_batched(actions, batch_size):
+            if error:
+                results.append({'note_id': None, 'error': error})
+            elif result is None:
+                results.append({'note_id': None, 'error': 'AnkiConnect returned no noteId'})
+            else:
+                results.append({'note_id': int(result), 'error': None})
+
+        if verify:
+            summary = self.verify_cards_created([r['note_id'] for r in results if r['note_id'] is not None])
+            verified = set(summary['verified'])
+            for result in results:
+                result['verified'] = result['note_id'] in verified
+        return results
+
+    def update_cards(self, updates, batch_size=50):
+        """Overwrite the fields of existing notes, batch_size notes per round-trip.
+
+        updates is a list of (note_id, card) pairs, card being a dict like in add_cards.
+        Returns a list aligned with updates, each entry {'note_id': int, 'error': str or None}.
+        """
+        image_filename = self._store_back_image() if self.back_image else None
+        actions = [{
+            'action': 'updateNoteFields',
             'version': 6,
             'params': {
-                'notes': [note_id]
+                'note': {
+                    'id': note_id,
+                    'fields': self._build_note(card['front'], card['back'], card.get('source', ''), image_filename)['fields']
+                }
             }
-        })
-        print(f"Verification response: {response.text}")
+        } for note_id, card in updates]
+        return [{'note_id': note_id, 'error': error}
+                for (note_id, _), (_, error) in zip(updates, self._run_batched(actions, batch_size))]
+
+    def _deck_notes_by_front(self):
+        """Return {front_hash: (note_id, fields, tags)} with the newest note per front in self.deck_name.
+
+        Only self.note_type notes directly in the deck are read (see deck_notes_query), so notes in
+        subdecks or of other note types are never matched, and so never updated.
+        """
+        note_ids = self.transport.request('findNotes', {'query': deck_notes_query(self.deck_name, self.note_type)}, timeout=60)
+        notes = {}
+        newest = {}
+        for note_info in iter_notes_info(note_ids, transport=self.transport):
+            fields = {name: field.get('value', '') for name, field in note_info.get('fields', {}).items()}
+            key = front_hash(fields.get('Front', ''))
+            if key not in notes or note_info.get('mod', 0) > newest[key]:
+                notes[key] = (note_info.get('noteId'), fields, note_info.get('tags', []))
+                newest[key] = note_info.get('mod', 0)
+        return notes
+
+    def upsert_cards(self, cards, batch_size=50, verify=False):
+        """Add or update cards keyed on their (normalized) front, batch_size actions per round-trip.
+
+        The target deck is read once. A card whose front already has a note there updates that
+        note's fields (and its tags, if the card has a 'tags' list) with updateNote; other cards
+        are added, with the duplicate check scoped to the target deck so notes in other decks
+        do not block them. Cards identical to their note are left alone, so re-running an
+        import changes nothing and the deck keeps its size.
+
+        Returns a list aligned with cards, each entry {'note_id', 'action', 'error'} where action
+        is 'added', 'updated', 'unchanged' or 'skipped' (a front repeated earlier in cards).
+        With verify=True added notes are confirmed like in add_cards and get a 'verified' bool.
+        """
         try:
-            response_json = response.json()
-            if response_json.get('error'):
-                notify(f"Verification error: {response_json.get('error')}")
-                print(f"Verification error: {response_json.get('error')}")
-                return False
-            if response_json.get('result') and len(response_json['result']) > 0:
-                 # Check if the note_id is present in any of the fields of the first result
-                if any(str(note_id) in str(field_value) for field_value in response_json['result'][0].values()):
-                     notify('Card created successfully (verified by notesInfo).')
-                     return True
-                # Fallback check on raw text if specific field check is too complex or note_id format varies
-                elif str(note_id) in response.text: # Check if note_id is mentioned anywhere in the successful response
-                    notify('Card created successfully (verified by note_id in response text).')
-                    return True
-            notify(f"Card verification failed, noteId {note_id} not found clearly in notesInfo response: {response.text}")
-            return False
-        except ValueError: # JSONDecodeError
-            notify(f"Verification response was not valid JSON: {response.text}")
-            print(f"Verification response was not valid JSON: {response.text}")
-            # Fallback: simple check if note_id is in the raw text (less reliable)
-            if str(note_id) in response.text:
-                notify('Card created successfully (verified by note_id in non-JSON response text - less reliable).')
-                return True
-            return False
+            existing = self._deck_notes_by_front()
+        except (requests.RequestException, ValueError, RuntimeError) as e:
+            error_message = f"Could not read deck '{self.deck_name}': {e}"
+            print(error_message)
+            return [{'note_id': None, 'action': None, 'error': error_message} for _ in cards]
+
+        image_filename = self._store_back_image() if self.back_image else None
+        results = [None] * len(cards)
+        pending = []  # (index into cards, note_id or None for adds, action)
+        seen = set()
+        for i, card in enumerate(cards):
+            key = front_hash(card['front'])
+            if key in seen:
+                results[i] = {'note_id': None, 'action': 'skipped', 'error': None}
+                continue
+            seen.add(key)
+            note = self._build_note(card['front'], card['back'], card.get('source', ''), image_filename)
+            if 'tags' in card:
+                note['tags'] = list(card['tags'])
+
+            match = existing.get(key)
+            if match is None:
+                note['options']['duplicateScope'] = 'deck'
+                pending.append((i, None, {'action': 'addNote', 'version': 6, 'params': {'note': note}}))
+                continue
+            note_id, fields, tags = match
+            fields_changed = any(fields.get(name, '') != value for name, value in note['fields'].items())
+            tags_changed = 'tags' in card and sorted(tags) != sorted(note['tags'])
+            if not fields_changed and not tags_changed:
+                results[i] = {'note_id': note_id, 'action': 'unchanged', 'error': None}
+                continue
+            update = {'id': note_id, 'fields': note['fields']}
+            if 'tags' in card:
+                update['tags'] = note['tags']
+            pending.append((i, note_id, {'action': 'updateNote', 'version': 6, 'params': {'note': update}}))
+
+        outcomes = self._run_batched([action for _, _, action in pending], batch_size)
+        for (i, note_id, action), (result, error) in zip(pending, outcomes):
+            if note_id is not None:
+                results[i] = {'note_id': note_id, 'action': 'updated', 'error': error}
+            elif error or result is None:
+                results[i] = {'note_id': None, 'action': 'added', 'error': error or 'AnkiConnect returned no noteId'}
+            else:
+                results[i] = {'note_id': int(result), 'action': 'added', 'error': None}
+
+        if verify:
+            added = [r['note_id'] for r in results if r['action'] == 'added' and r['note_id'] is not None]
+            verified = set(self.verify_cards_created(added)['verified'])
+            for result in results:
+                if result['action'] == 'added':
+                    result['verified'] = result['note_id'] in verified
+        return results
 
 
 #FOR TESTING
@@ -0,0 +1,105 @@
+import asyncio
+import time
+import httpx
+from AnkiConnector import AnkiConnector, MEDIA_PREFIX, get_media_index, notify
+from anki_utils import ANKI_CONNECT_URL, ANKI_CONNECT_VERSION, DEFAULT_TIMEOUT, get_request_log
+
+class AsyncAnkiConnector(AnkiConnector):
+    """asyncio counterpart of AnkiConnector for coroutine callers such as main.py.
+
+    Exposes the same add_card / verify_card_created / media surface as awaitables,
+    backed by one pooled httpx.AsyncClient so Anki round-trips never block the event loop.
+    Use as 'async with AsyncAnkiConnector(...) as connector:' or call aclose() when done.
+    """
+
+    def __init__(self, deck_name='Default', note_type='Basic', allow_duplicate=False, back_image=None,
+                 url=ANKI_CONNECT_URL, timeout=DEFAULT_TIMEOUT):
+        super().__init__(deck_name=deck_name, note_type=note_type, allow_duplicate=allow_duplicate, back_image=back_image)
+        self.url = url
+        self.client = httpx.AsyncClient(timeout=timeout)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def invoke(self, action, params=None, timeout=None):
+        """Send one AnkiConnect action and return the decoded {'result', 'error'} dict."""
+        payload = {'action': action, 'version': ANKI_CONNECT_VERSION}
+        if params is not None:
+            payload['params'] = params
+        kwargs = {} if timeout is None else {'timeout': timeout}
+        started = time.monotonic()
+        try:
+            response = await self.client.post(self.url, json=payload, **kwargs)
+            response.raise_for_status()
+            try:
+                response_json = response.json()
+            except ValueError:
+                raise ValueError(f"AnkiConnect returned non-JSON response: {response.text}")
+        except (httpx.HTTPError, ValueError) as e:
+            get_request_log().record(action, params, error=e, duration=time.monotonic() - started)
+            raise
+        get_request_log().record(action, params, response_json, duration=time.monotonic() - started)
+        return response_json
+
+    async def back_image_upload(self):
+        """Return (filename, storeMediaFile params) for self.back_image; params is None if Anki already has it."""
+        # Hashing the image is blocking file I/O, keep it off the loop
+        params = await asyncio.to_thread(self._back_image_media_params)
+        media_index = get_media_index()
+        if not media_index.seeded:
+            try:
+                response_json = await self.invoke('getMediaFilesNames', {'pattern': MEDIA_PREFIX + '*'})
+                if not response_json.get('error'):
+                    media_index.seed(response_json.get('result'))
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"Could not list Anki media files: {e}")
+        if params['filename'] in media_index:
+            print(f"Media {params['filename']} already in Anki, skipping upload")
+            return params['filename'], None
+        return params['filename'], params
+
+    async def store_back_image(self):
+        """Upload self.back_image to Anki's media folder unless Anki already has it; return the filename."""
+        filename, params = await self.back_image_upload()
+        if params:
+            response_json = await self.invoke('storeMediaFile', params, timeout=30)
+            if response_json.get('error'):
+                raise RuntimeError(f"AnkiConnect API error (storeMediaFile): {response_json.get('error')}")
+            get_media_index().add(filename)
+        return filename
+
+    async def add_card(self, front, back, source, verify=True):
+        """Add one card in a single 'multi' round-trip, see AnkiConnector.add_card."""
+        try:
+            image_filename, media_params = await self.back_image_upload() if self.back_image else (None, None)
+        except OSError as e:
+            error_message = f"Could not read back image: {e}"
+            notify(error_message)
+            print(error_message)
+            return False
+        note = self._build_note(front, back, source, image_filename)
+        actions = self._add_card_actions(note, media_params, verify)
+
+        try:
+            response_json = await self.invoke('multi', {'actions': actions}, timeout=30)
+        except (httpx.HTTPError, ValueError) as e:
+            error_message = f"AnkiConnect request failed: {e}"
+            notify(error_message)
+            print(error_message)
+            return False
+        return self._handle_add_card_results(response_json, media_params, verify)
+
+    async def verify_card_created(self, note_id):
+        try:
+            response_json = await self.invoke('notesInfo', {'notes': [note_id]})
+        except (httpx.HTTPError, ValueError) as e:
+            notify(f"Verification request failed: {e}")
+            print(f"Verification request failed: {e}")
+            return False
+        return self._check_verification_response(note_id, response_json)
@@ -4,192 +4,606 @@ AI Tutor JSON to Anki Script
 Automatically converts JSON flashcards to Anki cards and adds them to the ...IBAC25 deck.
 """
 
+import argparse
+import glob
+import hashlib
 import sys
 import json
 import os
-import requests
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
 from AnkiConnector import AnkiConnector
-from anki_utils import ensure_anki_running
+from anki_utils import REQUEST_LOG_PATH, ensure_anki_running, front_hash, get_request_log, get_transport
+# The JSON extractor is shared with the root scripts; append (not prepend) its directory so the
+# local AnkiConnector and anki_utils still win
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from json_extract import extract_cards
 
-def load_json_cards(json_path):
-    """Load and parse JSON cards from file."""
+STREAM_BATCH_SIZE = 20
+STREAM_MAX_WAIT = 2.0  # seconds a partial batch waits for more cards before it is sent
+MANIFEST_SUFFIX = '.anki-manifest'
+
+def parse_card_file(json_path):
+    """Parse and validate one card file without printing; safe to run in a worker process.
+
+    .jsonl files are read as one card per line, anything else with extract_cards.
+    Returns {'path', 'cards', 'invalid', 'error'} where invalid is a list of skipped items
+    and error is a message if the file could not be read or holds no valid card.
+    """
+    parsed = {'path': json_path, 'cards': [], 'invalid': [], 'error': None}
     if not os.path.exists(json_path):
-        print(f"Error: File '{json_path}' not found.", file=sys.stderr)
-        return None
-    
+        parsed['error'] = f"File '{json_path}' not found."
+        return parsed
     try:
         with open(json_path, "r", encoding="utf-8") as f:
-            text = f.read()
-        
-        # Handle markdown code blocks if present
-        cleaned_text = text
-        if '```json' in text and '```' in text:
-            start_marker = text.find('```json')
-            if start_marker != -1:
-                start_content = start_marker + len('```json')
-                end_marker = text.find('```', start_content)
-                if end_marker != -1:
-                    cleaned_text = text[start_content:end_marker].strip()
-        
-        # Find JSON array boundaries
-        start_idx = cleaned_text.find('[')
-        if start_idx == -1:
-            print("Error: No opening bracket '[' found in text.", file=sys.stderr)
-            return None
-        
-        # Find matching closing bracket
-        bracket_count = 0
-        end_idx = -1
-        for i in range(start_idx, len(cleaned_text)):
-            if cleaned_text[i] == '[':
-                bracket_count += 1
-            elif cleaned_text[i] == ']':
-                bracket_count -= 1
-                if bracket_count == 0:
-                    end_idx = i
-                    break
-        
-        if end_idx == -1:
-            print("Error: No matching closing bracket ']' found in text.", file=sys.stderr)
-            return None
-        
-        json_text = cleaned_text[start_idx:end_idx + 1]
-        data = json.loads(json_text)
-        
-        # Validate cards have required fields
-        cards = []
-        for item in data:
-            if "front" in item and "back" in item:
-                cards.append(item)
+            if json_path.endswith('.jsonl'):
+                for line in f:
+                    card, error = parse_card_line(line)
+                    if error:
+                        parsed['invalid'].append(line.strip()[:100])
+                    elif card is not None:
+                        parsed['cards'].append(card)
             else:
-                print(f"Warning: Skipping invalid card (missing front/back): {item}")
-        
-        if not cards:
-            print("Error: No valid cards found in JSON.", file=sys.stderr)
-            return None
-            
-        return cards
-        
-    except json.JSONDecodeError as e:
-        print(f"Error: Failed to parse JSON: {e}", file=sys.stderr)
-        return None
+                # Find every JSON array of cards (fenced or not), ignoring brackets inside strings
+                parsed['cards'], parsed['invalid'] = extract_cards(f.read())
     except Exception as e:
-        print(f"Error: Failed to load JSON file: {e}", file=sys.stderr)
+        parsed['error'] = f"Failed to load JSON file: {e}"
+    if not parsed['error'] and not parsed['cards']:
+        parsed['error'] = "No valid cards found in JSON."
+    return parsed
+
+def load_json_cards(json_path):
+    """Load and parse JSON cards from file."""
+    parsed = parse_card_file(json_path)
+    for item in parsed['invalid']:
+        print(f"Warning: Skipping invalid card (missing front/back): {item}")
+    
+    if parsed['error']:
+        print(f"Error: {parsed['error']}", file=sys.stderr)
         return None
+    
+    return parsed['cards']
+
+def manifest_path(json_path):
+    """Sidecar manifest for json_path: a hidden file next to it, so directory imports never pick it up."""
+    directory, name = os.path.split(json_path)
+    return os.path.join(directory, '.' + name + MANIFEST_SUFFIX)
+
+def card_digest(card):
+    """Fixed-size digest of the fields a card is imported with."""
+    content = json.dumps([card['front'], card['back'], card.get('source', '')], ensure_ascii=False)
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+def load_manifest(json_path, deck_name):
+    """Return {front_hash: {'digest', 'note_id'}} recorded for json_path's last import into deck_name."""
+    try:
+        with open(manifest_path(json_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('deck') != deck_name:
+        return {}
+    return manifest.get('cards', {})
+
+def save_manifest(json_path, deck_name, entries):
+    path = manifest_path(json_path)
+    temp_path = path + '.tmp'
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'deck': deck_name, 'cards': entries}, f)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Could not save import manifest {path}: {e}")
+
+def plan_import(cards, sources, deck_name, full=False):
+    """Compare cards with their source files' manifests and decide what has to be sent.
+
+    Returns a plan dict: 'cards'/'sources' are the new cards (and their files), 'updates' is a
+    list of (note_id, card, source) for cards whose content changed since they were imported,
+    'unchanged' counts skipped cards per file and 'entries' holds the manifest entries to keep.
+    A card that is sent keeps its previous entry until the send confirms it, so a failed or
+    unresolved send is retried on the next run. With full=True unchanged cards are sent again
+    as well (they show up as duplicates, or are re-added if they were deleted from Anki).
+    """
+    manifests = {source: load_manifest(source, deck_name) for source in set(sources)}
+    plan = {'cards': [], 'sources': [], 'updates': [], 'unchanged': {source: 0 for source in manifests},
+            'entries': {source: {} for source in manifests}}
+    for card, source in zip(cards, sources):
+        key = front_hash(card['front'])
+        entry = manifests[source].get(key)
+        if entry:
+            plan['entries'][source][key] = entry
+        if entry and entry['digest'] == card_digest(card) and not full:
+            plan['unchanged'][source] += 1
+        elif entry and entry.get('note_id') and entry['digest'] != card_digest(card):
+            plan['updates'].append((entry['note_id'], card, source))
+        else:
+            plan['cards'].append(card)
+            plan['sources'].append(source)
+    return plan
+
+def record_in_plan(plan, card, source, note_id):
+    plan['entries'][source][front_hash(card['front'])] = {'digest': card_digest(card), 'note_id': note_id}
+
+def expand_inputs(inputs):
+    """Expand directories (their *.json and *.jsonl files) and glob patterns into a list of file paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, '*.json')) + glob.glob(os.path.join(item, '*.jsonl'))))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    # The same file named twice (e.g. by a directory and a glob) is only read once
+    return list(dict.fromkeys(paths))
+
+def parse_card_files(paths):
+    """Parse paths in a process pool (in order) and return their parse_card_file results."""
+    if len(paths) == 1:
+        return [parse_card_file(paths[0])]
+    with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1)) as pool:
+        return list(pool.map(parse_card_file, paths))
+
+def merge_card_files(parsed_files):
+    """Merge parsed files into (cards, sources), dropping cards whose normalized front was already seen.
+
+    sources[i] is the path cards[i] came from. Each parsed file gets a 'repeated' count of
+    cards dropped because an earlier card (in this or an earlier file) had the same front.
+    """
+    cards, sources = [], []
+    seen = set()
+    for parsed in parsed_files:
+        parsed['repeated'] = 0
+        for card in parsed['cards']:
+            key = front_hash(card['front'])
+            if key in seen:
+                parsed['repeated'] += 1
+                continue
+            seen.add(key)
+            cards.append(card)
+            sources.append(parsed['path'])
+    return cards, sources
 
 def create_deck_if_not_exists(deck_name):
     """Create the deck if it doesn't exist."""
+    transport = get_transport()
     try:
         # Check if deck exists
-        response = requests.post('http://localhost:8765', json={
-            'action': 'deckNames',
-            'version': 6
-        })
-        
-        if response.status_code == 200:
-            deck_names = response.json().get('result', [])
-            if deck_name not in deck_names:
-                print(f"Deck '{deck_name}' not found. Creating it...")
-                # Create the deck
-                create_response = requests.post('http://localhost:8765', json={
-                    'action': 'createDeck',
-                    'version': 6,
-                    'params': {
-                        'deck': deck_name
-                    }
-                })
-                
-                if create_response.status_code == 200:
-                    result = create_response.json()
-                    if result.get('error'):
-                        print(f"Error creating deck: {result.get('error')}")
-                        return False
-                    else:
-                        print(f"Successfully created deck '{deck_name}'")
-                        return True
-                else:
-                    print(f"Failed to create deck. HTTP status: {create_response.status_code}")
-                    return False
+        response_json = transport.invoke('deckNames')
+        if response_json.get('error'):
+            print(f"Failed to check existing decks: {response_json.get('error')}")
+            return False
+
+        deck_names = response_json.get('result', [])
+        if deck_name not in deck_names:
+            print(f"Deck '{deck_name}' not found. Creating it...")
+            # Create the deck
+            result = transport.invoke('createDeck', {'deck': deck_name})
+            if result.get('error'):
+                print(f"Error creating deck: {result.get('error')}")
+                return False
             else:
-                print(f"Deck '{deck_name}' already exists.")
+                print(f"Successfully created deck '{deck_name}'")
                 return True
         else:
-            print(f"Failed to check existing decks. HTTP status: {response.status_code}")
-            return False
+            print(f"Deck '{deck_name}' already exists.")
+            return True
             
     except Exception as e:
         print(f"Error checking/creating deck: {e}")
         return False
 
-def add_cards_to_anki(cards, deck_name="...IBAC25"):
-    """Add all cards to the specified Anki deck."""
+def parse_card_line(line):
+    """Parse one JSON Lines card; return (card, error), or (None, None) for a blank line."""
+    line = line.strip()
+    if not line:
+        return None, None
+    try:
+        card = json.loads(line)
+    except json.JSONDecodeError as e:
+        return None, f"invalid JSON ({e})"
+    if not isinstance(card, dict) or "front" not in card or "back" not in card:
+        return None, "missing front/back"
+    return card, None
+
+def preflight_cards(connector, cards, report=True):
+    """Partition cards into (addable, duplicates, invalid) before any write.
+
+    Uses one canAddNotesWithErrorDetail call for the whole list. duplicates and invalid
+    are lists of (card, error) tuples. If the check is unavailable every card is treated
+    as addable and the per-card add results report any problems instead.
+    """
+    checks = connector.can_add_cards(cards)
+    if checks is None:
+        if report:
+            print("Preflight check unavailable, sending all cards.")
+        return list(cards), [], []
+
+    addable, duplicates, invalid = [], [], []
+    for card, check in zip(cards, checks):
+        if check['canAdd']:
+            addable.append(card)
+        elif 'duplicate' in (check['error'] or '').lower():
+            duplicates.append((card, check['error']))
+        else:
+            invalid.append((card, check['error']))
+
+    if not report:
+        return addable, duplicates, invalid
+    print(f"\nPreflight:")
+    print(f"  Addable: {len(addable)} cards")
+    print(f"  Duplicates (already in Anki): {len(duplicates)} cards")
+    for card, error in duplicates:
+        print(f"    - {card['front'][:50]}...")
+    print(f"  Invalid: {len(invalid)} cards")
+    for card, error in invalid:
+        print(f"    - {card['front'][:50]}... ({error})")
+    return addable, duplicates, invalid
+
+def resolve_duplicates(connector, duplicates, entries, batch_size=50):
+    """Find the deck notes of cards preflight reported as duplicates, updating tracked notes that differ.
+
+    entries is aligned with duplicates: each card's manifest entry, or None. The deck is read
+    once and matched on the normalized front. A note whose fields differ from its card is only
+    updated if the manifest tracks it (an entry without a note id, or with this note's id), so
+    edits made in Anki to notes this importer never recorded are left alone. Returns a list
+    aligned with duplicates of (note_id, action), action being 'unchanged' or 'updated';
+    (None, None) means the card is not in this deck (e.g. a duplicate elsewhere), differs from
+    an untracked note, or its update failed, and it must not be recorded as synced.
+    """
+    resolved = [(None, None)] * len(duplicates)
+    try:
+        deck_notes = connector._deck_notes_by_front()
+    except Exception as e:
+        print(f"Could not read deck notes to match duplicates: {e}")
+        return resolved
+    updates = []
+    untracked = 0
+    for i, ((card, _), entry) in enumerate(zip(duplicates, entries)):
+        match = deck_notes.get(front_hash(card['front']))
+        if match is None:
+            continue
+        note_id, fields, _ = match
+        wanted = connector._build_note(card['front'], card['back'], card.get('source', ''))['fields']
+        if not any(fields.get(name, '') != value for name, value in wanted.items()):
+            resolved[i] = (note_id, 'unchanged')
+        elif entry and entry.get('note_id') in (None, note_id):
+            updates.append((i, note_id, card))
+        else:
+            untracked += 1
+    if untracked:
+        print(f"{untracked} cards differ from notes in the deck that no import manifest tracks; left as they are "
+              f"(fix_duplicate_cards.py overwrites them)")
+    if updates:
+        print(f"Updating {len(updates)} cards that are already in the deck with different content...")
+        for (i, note_id, card), result in zip(updates, connector.update_cards([(note_id, card) for _, note_id, card in updates], batch_size)):
+            if result['error'] is None:
+                resolved[i] = (note_id, 'updated')
+            else:
+                print(f"  ✗ Failed to update card: {card['front'][:50]}... ({result['error']})")
+    return resolved
+
+def connect_to_deck(deck_name):
+    """Make sure Anki is running and deck_name exists; return an AnkiConnector for it, or None."""
     print(f"Ensuring Anki is running...")
     if not ensure_anki_running():
         print("Error: Could not start or connect to Anki. Please start Anki manually.", file=sys.stderr)
-        return False
+        return None
     
     # Create deck if it doesn't exist
     if not create_deck_if_not_exists(deck_name):
         print(f"Error: Could not create or access deck '{deck_name}'", file=sys.stderr)
-        return False
+        return None
     
     print(f"Connecting to Anki deck: {deck_name}")
-    connector = AnkiConnector(deck_name=deck_name, note_type="Basic", allow_duplicate=False)
+    return AnkiConnector(deck_name=deck_name, note_type="Basic", allow_duplicate=False)
+
+def print_failed_requests():
+    failed_requests = get_request_log().entries(errors_only=True)
+    if failed_requests:
+        print(f"\nFailed AnkiConnect requests this run: {len(failed_requests)} (full log: {REQUEST_LOG_PATH}, 'python anki_utils.py --failed' lists them)")
+        for entry in failed_requests[-10:]:
+            print(f"  {entry['action']}: {entry['params']} -> {entry['error']}")
+
+def print_file_report(parsed_files, sources, cards, addable, results, duplicates, invalid, plan=None):
+    """Print one line per source file: cards parsed, skipped, added, already in Anki and failed."""
+    card_source = {id(card): source for card, source in zip(cards, sources)}
+    counts = {parsed['path']: {'added': 0, 'duplicates': 0, 'failed': 0, 'updated': 0} for parsed in parsed_files}
+    for update in (plan or {}).get('updated', []):
+        counts[update[2]]['updated'] += 1
+    for card, result in zip(addable, results):
+        counts[card_source[id(card)]]['added' if result['note_id'] is not None else 'failed'] += 1
+    for card, _ in duplicates:
+        counts[card_source[id(card)]]['duplicates'] += 1
+    for card, _ in invalid:
+        counts[card_source[id(card)]]['failed'] += 1
     
-    success_count = 0
-    failed_count = 0
+    print(f"\nPer-file report:")
+    for parsed in parsed_files:
+        if parsed['error']:
+            print(f"  {parsed['path']}: ✗ {parsed['error']}")
+            continue
+        file_counts = counts[parsed['path']]
+        unchanged = f"{plan['unchanged'].get(parsed['path'], 0)} unchanged, " if plan else ''
+        print(f"  {parsed['path']}: {len(parsed['cards'])} cards, {len(parsed['invalid'])} invalid, "
+              f"{parsed.get('repeated', 0)} repeated, {unchanged}-> {file_counts['added']} added, "
+              f"{file_counts['updated']} updated, {file_counts['duplicates']} already in Anki, {file_counts['failed']} failed")
+
+def save_plan_manifests(plan, deck_name, parsed_files=None):
+    readable = {parsed['path'] for parsed in parsed_files if not parsed['error']} if parsed_files else plan['entries'].keys()
+    for source, entries in plan['entries'].items():
+        if source in readable:
+            save_manifest(source, deck_name, entries)
+
+def add_cards_to_anki(cards, deck_name="...IBAC25", batch_size=50, sources=None, parsed_files=None, plan=None):
+    """Add all cards to the specified Anki deck.
+
+    When importing several files, pass sources (the file each card came from, parallel to
+    cards) and parsed_files (from parse_card_files) to get a per-file report as well.
+    With a plan from plan_import, changed cards are updated in place and each source file's
+    manifest is rewritten with the resulting note ids.
+    """
+    updates = plan['updates'] if plan else []
+    if plan and not cards and not updates:
+        print(f"\nNothing to send: all {sum(plan['unchanged'].values())} cards are unchanged since the last import.")
+        print("Use --full to send every card again.")
+        if sources is not None and parsed_files is not None:
+            print_file_report(parsed_files, sources, cards, [], [], [], [], plan)
+        save_plan_manifests(plan, deck_name, parsed_files)
+        return True
     
-    for i, card in enumerate(cards, 1):
-        front = card["front"]
-        back = card["back"]
-        source = card.get("source", "")
-        
-        print(f"Adding card {i}/{len(cards)}: {front[:50]}...")
-        
-        try:
-            success = connector.add_card(front, back, source)
-            if success:
-                success_count += 1
-                print(f"  ✓ Successfully added card {i}")
+    connector = connect_to_deck(deck_name)
+    if connector is None:
+        return False
+    
+    failed_updates = 0
+    if updates:
+        print(f"Updating {len(updates)} changed cards...")
+        plan['updated'] = []
+        update_results = connector.update_cards([(note_id, card) for note_id, card, _ in updates], batch_size=batch_size)
+        for (note_id, card, source), result in zip(updates, update_results):
+            if result['error'] is None:
+                plan['updated'].append((note_id, card, source))
+                record_in_plan(plan, card, source, note_id)
+            elif 'not found' in result['error'].lower():
+                # Deleted from Anki since the last import: add it again
+                cards = cards + [card]
+                sources = sources + [source]
             else:
-                failed_count += 1
-                print(f"  ✗ Failed to add card {i}")
-        except Exception as e:
+                failed_updates += 1
+                print(f"  ✗ Failed to update card: {card['front'][:50]}... ({result['error']})")
+    
+    addable, duplicates, invalid = preflight_cards(connector, cards)
+
+    print(f"Adding {len(addable)} cards in batches of {batch_size}...")
+    results = connector.add_cards(addable, batch_size=batch_size, verify=True)
+
+    success_count = 0
+    failed_count = len(invalid) + failed_updates
+
+    for i, (card, result) in enumerate(zip(addable, results), 1):
+        if result['note_id'] is not None:
+            success_count += 1
+        else:
             failed_count += 1
-            print(f"  ✗ Error adding card {i}: {e}")
+            print(f"  ✗ Failed to add card {i}: {card['front'][:50]}... ({result['error']})")
+    
+    if plan:
+        card_source = {id(card): source for card, source in zip(cards, sources)}
+        for card, result in zip(addable, results):
+            if result['note_id'] is not None:
+                record_in_plan(plan, card, card_source[id(card)], result['note_id'])
+        # Already in Anki: only record a card once its note is known and matches the card;
+        # otherwise its previous manifest entry is kept and it is sent again next run
+        still_duplicates = []
+        entries = [plan['entries'][card_source[id(card)]].get(front_hash(card['front'])) for card, _ in duplicates]
+        for (card, error), (note_id, action) in zip(duplicates, resolve_duplicates(connector, duplicates, entries, batch_size) if duplicates else []):
+            if note_id is None:
+                still_duplicates.append((card, error))
+                continue
+            record_in_plan(plan, card, card_source[id(card)], note_id)
+            if action == 'updated':
+                plan.setdefault('updated', []).append((note_id, card, card_source[id(card)]))
+            else:
+                still_duplicates.append((card, error))
+        duplicates = still_duplicates
+        save_plan_manifests(plan, deck_name, parsed_files)
     
     print(f"\nResults:")
     print(f"  Successfully added: {success_count} cards")
+    if plan:
+        print(f"  Updated (changed since last import): {len(plan.get('updated', []))} cards")
+        print(f"  Unchanged since last import: {sum(plan['unchanged'].values())} cards")
+    print(f"  Skipped duplicates: {len(duplicates)} cards")
     print(f"  Failed to add: {failed_count} cards")
-    print(f"  Total processed: {len(cards)} cards")
+    print(f"  Verified in Anki: {sum(1 for r in results if r.get('verified'))}/{success_count} cards")
+    print(f"  Total processed: {len(cards) + len(updates)} cards")
+
+    if sources is not None and parsed_files is not None:
+        print_file_report(parsed_files, sources, cards, addable, results, duplicates, invalid, plan)
+
+    print_failed_requests()
     
     return failed_count == 0
 
+def _read_lines(f, lines):
+    try:
+        for line in f:
+            lines.put(line)
+    finally:
+        lines.put(None)
+
+def stream_cards_to_anki(f, deck_name="...IBAC25", batch_size=STREAM_BATCH_SIZE, max_wait=STREAM_MAX_WAIT):
+    """Add JSON Lines cards from file object f to Anki in micro-batches as they arrive.
+
+    A batch is sent once it has batch_size cards, or max_wait seconds after its first card
+    arrived, so a slow generator piping into stdin still sees its cards land promptly.
+    Lines are read on a background thread; only the current batch is held in memory.
+    """
+    connector = connect_to_deck(deck_name)
+    if connector is None:
+        return False
+    
+    lines = queue.Queue(maxsize=batch_size * 10)
+    threading.Thread(target=_read_lines, args=(f, lines), daemon=True).start()
+    
+    totals = {'received': 0, 'added': 0, 'duplicates': 0, 'failed': 0, 'invalid_lines': 0}
+    pending = []
+    pending_since = None
+    batch_number = 0
+    
+    def flush():
+        nonlocal pending, pending_since, batch_number
+        if not pending:
+            return
+        batch_number += 1
+        addable, duplicates, invalid = preflight_cards(connector, pending, report=False)
+        results = connector.add_cards(addable, batch_size=batch_size, verify=True) if addable else []
+        added = sum(1 for r in results if r['note_id'] is not None)
+        failed = len(invalid) + len(results) - added
+        for card, result in zip(addable, results):
+            if result['note_id'] is None:
+                print(f"  ✗ Failed to add card: {card['front'][:50]}... ({result['error']})")
+        for card, error in invalid:
+            print(f"  ✗ Invalid card: {card['front'][:50]}... ({error})")
+        verified = sum(1 for r in results if r.get('verified'))
+        print(f"Batch {batch_number}: {added} added ({verified} verified), {len(duplicates)} duplicates skipped, {failed} failed")
+        totals['added'] += added
+        totals['duplicates'] += len(duplicates)
+        totals['failed'] += failed
+        pending = []
+        pending_since = None
+    
+    line_number = 0
+    while True:
+        timeout = None if pending_since is None else max(0, pending_since + max_wait - time.monotonic())
+        try:
+            line = lines.get(timeout=timeout)
+        except queue.Empty:
+            flush()
+            continue
+        if line is None:
+            break
+        line_number += 1
+        card, error = parse_card_line(line)
+        if error:
+            totals['invalid_lines'] += 1
+            print(f"Warning: Skipping line {line_number}: {error}")
+            continue
+        if card is None:
+            continue
+        totals['received'] += 1
+        pending.append(card)
+        if pending_since is None:
+            pending_since = time.monotonic()
+        if len(pending) >= batch_size:
+            flush()
+    flush()
+    
+    print(f"\nResults:")
+    print(f"  Successfully added: {totals['added']} cards")
+    print(f"  Skipped duplicates: {totals['duplicates']} cards")
+    print(f"  Failed to add: {totals['failed']} cards")
+    print(f"  Skipped invalid lines: {totals['invalid_lines']}")
+    print(f"  Total processed: {totals['received']} cards")
+    
+    print_failed_requests()
+    
+    return totals['failed'] == 0
+
 def main():
-    """Main function to process JSON file and add cards to Anki."""
-    if len(sys.argv) < 2:
-        print("Usage: python ai_tutor_json_to_anki.py <json_file_path> [deck_name]")
-        print("Example: python ai_tutor_json_to_anki.py cards.json")
-        print("Example: python ai_tutor_json_to_anki.py cards.json MyCustomDeck")
-        sys.exit(1)
+    """Main function to process JSON files and add cards to Anki."""
+    parser = argparse.ArgumentParser(
+        description="Add AI tutor JSON flashcards to Anki.",
+        epilog=f"Each imported file gets a hidden sidecar manifest (.<file>{MANIFEST_SUFFIX}) of card hashes and note ids, "
+               f"so re-runs only send new cards and update changed ones. "
+               f".jsonl files and '-' (stdin) hold one JSON card per line; on their own they are added in "
+               f"batches of {STREAM_BATCH_SIZE} as they arrive, without a manifest (cards already in the deck are "
+               f"skipped as duplicates). Example: card_generator | %(prog)s - MyCustomDeck")
+    parser.add_argument('inputs', nargs='+', metavar='path',
+                        help="JSON/JSONL files, directories or glob patterns, or '-' for stdin. "
+                             "With exactly two arguments, a second one that is not a file is taken as the deck name "
+                             "(e.g. cards.json MyCustomDeck); otherwise use --deck.")
+    parser.add_argument('--deck', help="target deck (default: ...IBAC25)")
+    parser.add_argument('--full', action='store_true',
+                        help="send every card again instead of only cards that are new or changed since the last import "
+                             "(not for a single .jsonl file or stdin, which are streamed without a manifest)")
+    parser.add_argument('--batch-size', type=int,
+                        help=f"cards per AnkiConnect request (default: 50, or {STREAM_BATCH_SIZE} when streaming)")
+    args = parser.parse_args()
     
-    json_path = sys.argv[1]
-    deck_name = sys.argv[2] if len(sys.argv) > 2 else "...IBAC25"
+    inputs = args.inputs
+    deck_name = args.deck
+    if deck_name is None and len(inputs) == 2 and inputs[-1] != '-' and not os.path.exists(inputs[-1]) \
+            and not glob.has_magic(inputs[-1]):
+        # Legacy "<file> <deck>" form; a missing file is reported instead of becoming a deck
+        if inputs[-1].endswith(('.json', '.jsonl', '/', os.sep)):
+            parser.error(f"'{inputs[-1]}' not found (use --deck to name the target deck)")
+        deck_name = inputs.pop()
+    deck_name = deck_name or "...IBAC25"
     
     print(f"AI Tutor JSON to Anki Converter")
-    print(f"JSON file: {json_path}")
+    print(f"JSON file: {'stdin' if inputs == ['-'] else ', '.join(inputs)}")
     print(f"Target deck: {deck_name}")
     print("-" * 50)
     
-    # Load cards from JSON
-    cards = load_json_cards(json_path)
-    if cards is None:
+    if '-' in inputs and inputs != ['-']:
+        print("Error: '-' (stdin) cannot be combined with other inputs.", file=sys.stderr)
         sys.exit(1)
     
-    print(f"Loaded {len(cards)} valid cards from JSON file.")
+    paths = ['-'] if inputs == ['-'] else expand_inputs(inputs)
+    if not paths:
+        print("Error: No JSON files found.", file=sys.stderr)
+        sys.exit(1)
     
-    # Add cards to Anki
-    success = add_cards_to_anki(cards, deck_name)
+    if paths == ['-'] or (len(paths) == 1 and paths[0].endswith('.jsonl')):
+        if args.full:
+            parser.error("--full needs an import manifest; a single .jsonl file or stdin is streamed without one "
+                         "and always sends every card")
+        if paths == ['-']:
+            success = stream_cards_to_anki(sys.stdin, deck_name, args.batch_size or STREAM_BATCH_SIZE)
+        elif not os.path.exists(paths[0]):
+            print(f"Error: File '{paths[0]}' not found.", file=sys.stderr)
+            sys.exit(1)
+        else:
+            with open(paths[0], "r", encoding="utf-8") as f:
+                success = stream_cards_to_anki(f, deck_name, args.batch_size or STREAM_BATCH_SIZE)
+    elif len(paths) == 1:
+        # Load cards from JSON
+        cards = load_json_cards(paths[0])
+        if cards is None:
+            sys.exit(1)
+        
+        print(f"Loaded {len(cards)} valid cards from JSON file.")
+        
+        # Only send cards that are new or changed since this file was last imported
+        plan = plan_import(cards, [paths[0]] * len(cards), deck_name, args.full)
+        
+        # Add cards to Anki
+        success = add_cards_to_anki(plan['cards'], deck_name, args.batch_size or 50, plan['sources'], plan=plan)
+    else:
+        print(f"Parsing {len(paths)} files...")
+        parsed_files = parse_card_files(paths)
+        cards, sources = merge_card_files(parsed_files)
+        for parsed in parsed_files:
+            if parsed['error']:
+                print(f"Warning: {parsed['path']}: {parsed['error']}")
+        if not cards:
+            print("Error: No valid cards found in JSON.", file=sys.stderr)
+            sys.exit(1)
+        
+        repeated = sum(parsed['repeated'] for parsed in parsed_files)
+        print(f"Loaded {len(cards)} valid cards from {len(paths)} files ({repeated} repeated fronts dropped).")
+        
+        plan = plan_import(cards, sources, deck_name, args.full)
+        success = add_cards_to_anki(plan['cards'], deck_name, args.batch_size or 50, plan['sources'], parsed_files, plan)
+        failed_files = sum(1 for parsed in parsed_files if parsed['error'])
+        if failed_files:
+            print(f"\n✗ {failed_files} of {len(parsed_files)} files could not be imported (see the per-file report)")
+        success = success and not failed_files
     
     if success:
         print(f"\n🎉 All cards successfully added to Anki deck '{deck_name}'!")
@@ -199,4 +613,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -7,141 +7,117 @@ but aren't actually in your deck, allowing you to re-add them properly.
 
 import sys
 import json
+from collections import defaultdict
 import requests
-from anki_utils import ensure_anki_running
+from anki_utils import NOTES_INFO_CHUNK_SIZE, deck_query, ensure_anki_running, front_digest, get_transport, iter_notes_info
+from anki_index import DeckIndex
+from note_records import SUMMARY_GROUPS, CsvReport, NoteRecord, default_report_path
 
-def find_notes_by_content(front_text, deck_name="...IBAC25"):
-    """Find notes in Anki that match the front text content."""
-    try:
-        # Search for notes with matching front field content
-        response = requests.post('http://localhost:8765', json={
-            'action': 'findNotes',
-            'version': 6,
-            'params': {
-                'query': f'deck:"{deck_name}" Front:"{front_text}"'
-            }
-        })
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('error'):
-                print(f"Error searching for notes: {result.get('error')}")
-                return []
-            return result.get('result', [])
-        else:
-            print(f"HTTP error searching for notes: {response.status_code}")
-            return []
-            
-    except Exception as e:
-        print(f"Exception searching for notes: {e}")
-        return []
+def build_front_map(deck_name="...IBAC25", chunk_size=NOTES_INFO_CHUNK_SIZE):
+    """Fetch the deck's notes once and return {front_digest: [NoteRecord, ...]}.
 
-def get_notes_info(note_ids):
-    """Get detailed information about specific notes."""
-    try:
-        response = requests.post('http://localhost:8765', json={
-            'action': 'notesInfo',
-            'version': 6,
-            'params': {
-                'notes': note_ids
-            }
-        })
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('error'):
-                print(f"Error getting notes info: {result.get('error')}")
-                return []
-            return result.get('result', [])
-        else:
-            print(f"HTTP error getting notes info: {response.status_code}")
-            return []
-            
-    except Exception as e:
-        print(f"Exception getting notes info: {e}")
-        return []
+    notesInfo is requested chunk_size notes at a time and only a NoteRecord is kept per note.
+    """
+    note_ids = get_transport().request('findNotes', {'query': deck_query(deck_name)}, timeout=60)
+    front_map = defaultdict(list)
+    for note_info in iter_notes_info(note_ids, chunk_size):
+        key = front_digest(note_info.get('fields', {}).get('Front', {}).get('value', ''))
+        front_map[key].append(NoteRecord(key, note_info.get('noteId'), note_info.get('mod', 0)))
+    return front_map
 
 def delete_notes(note_ids):
     """Delete specific notes from Anki."""
     try:
-        response = requests.post('http://localhost:8765', json={
-            'action': 'deleteNotes',
-            'version': 6,
-            'params': {
-                'notes': note_ids
-            }
-        })
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('error'):
-                print(f"Error deleting notes: {result.get('error')}")
-                return False
-            return True
-        else:
-            print(f"HTTP error deleting notes: {response.status_code}")
+        result = get_transport().invoke('deleteNotes', {'notes': note_ids})
+        if result.get('error'):
+            print(f"Error deleting notes: {result.get('error')}")
             return False
+        return True
             
     except Exception as e:
         print(f"Exception deleting notes: {e}")
         return False
 
-def find_and_clean_duplicates(cards, deck_name="...IBAC25", dry_run=True):
-    """Find and optionally clean duplicate cards."""
+def find_and_clean_duplicates(cards, deck_name="...IBAC25", dry_run=True, use_index=False,
+                              chunk_size=NOTES_INFO_CHUNK_SIZE, report_path=None):
+    """Find and optionally clean duplicate cards.
+
+    The deck is scanned once (see build_front_map) and the cards are joined against it on their
+    normalized front, so the cost is one deck scan however many cards are checked.
+    With use_index=True the join runs against the local SQLite index (see anki_index.py)
+    without fetching notes from Anki at all.
+    Matches are written to a CSV report (report_path, or a timestamped file under
+    ~/.cache/grammarpt/reports); the console only gets a summary.
+    """
     print(f"Searching for duplicate cards in deck: {deck_name}")
     print(f"Mode: {'DRY RUN (no changes will be made)' if dry_run else 'LIVE MODE (cards will be deleted)'}")
     print("-" * 60)
     
-    found_duplicates = []
+    index = None
+    if use_index:
+        index = DeckIndex()
+        try:
+            changes = index.sync(deck_name)
+        except Exception as e:
+            print(f"Error syncing index: {e}")
+            return False
+        print(f"Index synced: {changes['added']} added, {changes['updated']} updated, {changes['removed']} removed")
     
-    for i, card in enumerate(cards, 1):
-        front = card["front"]
-        print(f"Checking card {i}/{len(cards)}: {front[:50]}...")
-        
-        # Search for existing notes with this front text
-        note_ids = find_notes_by_content(front, deck_name)
+    if index:
+        def matching_notes(front):
+            return [NoteRecord(None, note_id, mod) for note_id, mod in index.find_front(deck_name, front)]
+    else:
+        print(f"Fetching deck notes in chunks of {chunk_size}...")
+        try:
+            front_map = build_front_map(deck_name, chunk_size)
+        except (requests.RequestException, RuntimeError, ValueError) as e:
+            print(f"Error retrieving deck notes: {e}")
+            return False
+        print(f"Fetched {sum(len(notes) for notes in front_map.values())} notes to match against")
         
-        if note_ids:
-            print(f"  Found {len(note_ids)} existing note(s) with matching front text")
-            
-            # Get detailed info about these notes
-            notes_info = get_notes_info(note_ids)
-            
-            for note_info in notes_info:
-                note_id = note_info.get('noteId')
-                fields = note_info.get('fields', {})
-                front_field = fields.get('Front', {}).get('value', '')
-                back_field = fields.get('Back', {}).get('value', '')
-                
-                print(f"    Note ID: {note_id}")
-                print(f"    Front: {front_field[:50]}...")
-                print(f"    Back: {back_field[:50]}...")
-                
-                found_duplicates.append({
-                    'note_id': note_id,
-                    'front': front_field,
-                    'back': back_field,
-                    'original_card': card
-                })
-        else:
-            print(f"  No existing notes found (this is unexpected if you're getting duplicate errors)")
+        def matching_notes(front):
+            return front_map.get(front_digest(front), [])
+    
+    note_ids_to_delete = []
+    seen_note_ids = set()
+    unmatched_cards = 0
+    report_path = report_path or default_report_path('duplicate_cleaner', deck_name)
+    
+    with CsvReport(report_path, ['card', 'front', 'note_id', 'mod']) as report:
+        for i, card in enumerate(cards, 1):
+            notes = matching_notes(card["front"])
+            if not notes:
+                unmatched_cards += 1
+                report.write(i, card["front"], '', '')
+                continue
+            if len(note_ids_to_delete) < SUMMARY_GROUPS and notes[0].note_id not in seen_note_ids:
+                print(f"Card {i}: {card['front'][:50]}... matches {len(notes)} existing note(s)")
+            for note in notes:
+                report.write(i, card["front"], note.note_id, note.mod)
+                # The same front can appear more than once in the JSON; delete each note once
+                if note.note_id not in seen_note_ids:
+                    seen_note_ids.add(note.note_id)
+                    note_ids_to_delete.append(note.note_id)
     
     print(f"\nSummary:")
     print(f"  Total cards checked: {len(cards)}")
-    print(f"  Duplicate notes found: {len(found_duplicates)}")
+    print(f"  Duplicate notes found: {len(note_ids_to_delete)}")
+    print(f"  Cards with no existing note: {unmatched_cards}")
+    print(f"  Report: {report_path} ({report.rows} rows)")
     
-    if found_duplicates and not dry_run:
-        print(f"\nDeleting {len(found_duplicates)} duplicate notes...")
-        note_ids_to_delete = [dup['note_id'] for dup in found_duplicates]
+    if note_ids_to_delete and not dry_run:
+        print(f"\nDeleting {len(note_ids_to_delete)} duplicate notes...")
         
         if delete_notes(note_ids_to_delete):
-            print(f"✓ Successfully deleted {len(found_duplicates)} duplicate notes")
+            if index:
+                index.remove_notes(note_ids_to_delete)
+            print(f"✓ Successfully deleted {len(note_ids_to_delete)} duplicate notes")
             return True
         else:
             print(f"✗ Failed to delete duplicate notes")
             return False
-    elif found_duplicates and dry_run:
-        print(f"\nDRY RUN: Would delete {len(found_duplicates)} duplicate notes")
+    elif note_ids_to_delete and dry_run:
+        print(f"\nDRY RUN: Would delete {len(note_ids_to_delete)} duplicate notes")
         print("Run with --live to actually delete them")
         return True
     else:
@@ -171,15 +147,25 @@ def load_json_cards(json_path):
 def main():
     """Main function."""
     if len(sys.argv) < 2:
-        print("Usage: python anki_duplicate_cleaner.py <json_file_path> [deck_name] [--live]")
+        print("Usage: python anki_duplicate_cleaner.py <json_file_path> [deck_name] [--live] [--index] [--report FILE.csv]")
         print("Example: python anki_duplicate_cleaner.py IBAC25cards.json")
         print("Example: python anki_duplicate_cleaner.py IBAC25cards.json '...IBAC25' --live")
         print("\nBy default, runs in DRY RUN mode. Use --live to actually delete duplicates.")
+        print("Use --index to match cards against the local deck index instead of scanning the deck.")
+        print("Every match is listed in a CSV report (--report, default under ~/.cache/grammarpt/reports).")
         sys.exit(1)
     
     json_path = sys.argv[1]
     deck_name = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith('--') else "...IBAC25"
     dry_run = '--live' not in sys.argv
+    use_index = '--index' in sys.argv
+    report_path = None
+    if '--report' in sys.argv:
+        try:
+            report_path = sys.argv[sys.argv.index('--report') + 1]
+        except IndexError:
+            print("Error: --report needs a file path", file=sys.stderr)
+            sys.exit(1)
     
     print(f"Anki Duplicate Cleaner")
     print(f"JSON file: {json_path}")
@@ -201,7 +187,7 @@ def main():
     print(f"Loaded {len(cards)} cards from JSON file.")
     
     # Find and clean duplicates
-    success = find_and_clean_duplicates(cards, deck_name, dry_run)
+    success = find_and_clean_duplicates(cards, deck_name, dry_run, use_index, report_path=report_path)
     
     if success:
         if dry_run:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Anki Deck Index
+Local SQLite mirror of deck contents (front hash, normalized front, note id, mod time, deck)
+kept current with incremental findNotes "edited:N" / notesInfo syncs, so duplicate checks,
+"is this fact already a card" checks and deck statistics are answered without AnkiConnect.
+"""
+
+import math
+import os
+import sqlite3
+import sys
+import time
+from anki_utils import NOTES_INFO_CHUNK_SIZE, deck_query, ensure_anki_running, front_hash, get_transport, iter_notes_info, normalize_front
+
+INDEX_PATH = os.path.expanduser('~/.cache/grammarpt/anki_index.sqlite3')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS notes (
+    note_id INTEGER PRIMARY KEY,
+    deck TEXT NOT NULL,
+    front_hash TEXT NOT NULL,
+    front_norm TEXT NOT NULL,
+    mod INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_deck_front_hash ON notes (deck, front_hash);
+CREATE TABLE IF NOT EXISTS sync_state (
+    deck TEXT PRIMARY KEY,
+    last_sync REAL NOT NULL
+);
+'''
+
+class DeckIndex:
+    """SQLite index of the notes in one or more decks."""
+
+    def __init__(self, path=INDEX_PATH, transport=None):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.transport = transport or get_transport()
+
+    def close(self):
+        self.db.close()
+
+    def last_sync(self, deck_name):
+        row = self.db.execute('SELECT last_sync FROM sync_state WHERE deck = ?', (deck_name,)).fetchone()
+        return row[0] if row else None
+
+    def sync(self, deck_name, chunk_size=NOTES_INFO_CHUNK_SIZE):
+        """Bring the index for deck_name up to date and return {'added', 'updated', 'removed', 'total'}.
+
+        The first sync fetches every note. Later syncs list the deck's note ids (cheap) to find
+        new and removed notes, and only fetch notesInfo for notes edited since the last sync.
+        """
+        started = time.time()
+        last_sync = self.last_sync(deck_name)
+        deck_ids = set(self.transport.request('findNotes', {'query': deck_query(deck_name)}, timeout=60))
+        known = dict(self.db.execute('SELECT note_id, mod FROM notes WHERE deck = ?', (deck_name,)))
+
+        removed = [note_id for note_id in known if note_id not in deck_ids]
+        to_fetch = deck_ids - known.keys()
+        if last_sync is None:
+            to_fetch = deck_ids
+        else:
+            # edited:N means "edited in the last N days"; add a day of slack for the day boundary
+            days = max(1, math.ceil((started - last_sync) / 86400) + 1)
+            edited = self.transport.request('findNotes', {'query': f'{deck_query(deck_name)} edited:{days}'}, timeout=60)
+            to_fetch |= deck_ids.intersection(edited)
+
+        added = updated = 0
+        rows = []
+        for note_info in iter_notes_info(sorted(to_fetch), chunk_size, transport=self.transport):
+            note_id = note_info.get('noteId')
+            if note_id is None:
+                continue
+            mod = note_info.get('mod', 0)
+            if known.get(note_id) == mod:
+                continue
+            if note_id in known:
+                updated += 1
+            else:
+                added += 1
+            front = note_info.get('fields', {}).get('Front', {}).get('value', '')
+            rows.append((note_id, deck_name, front_hash(front), normalize_front(front), mod))
+            if len(rows) >= chunk_size:
+                self._upsert(rows)
+                rows = []
+        self._upsert(rows)
+
+        with self.db:
+            self.db.executemany('DELETE FROM notes WHERE note_id = ?', [(note_id,) for note_id in removed])
+            self.db.execute('INSERT OR REPLACE INTO sync_state (deck, last_sync) VALUES (?, ?)', (deck_name, started))
+        return {'added': added, 'updated': updated, 'removed': len(removed), 'total': len(deck_ids)}
+
+    def _upsert(self, rows):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO notes (note_id, deck, front_hash, front_norm, mod) '
+                                'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def find_front(self, deck_name, front):
+        """Return [(note_id, mod), ...] for notes in deck_name whose normalized front matches front."""
+        return self.db.execute('SELECT note_id, mod FROM notes WHERE deck = ? AND front_hash = ? ORDER BY mod DESC',
+                               (deck_name, front_hash(front))).fetchall()
+
+    def duplicate_groups(self, deck_name):
+        """Return {front_norm: [(note_id, mod), ...] newest first} for fronts that appear more than once."""
+        groups = {}
+        rows = self.db.execute('''
+            SELECT n.front_norm, n.note_id, n.mod FROM notes n
+            JOIN (SELECT front_hash FROM notes WHERE deck = ? GROUP BY front_hash HAVING COUNT(*) > 1) d
+              ON n.front_hash = d.front_hash
+            WHERE n.deck = ? ORDER BY n.front_hash, n.mod DESC''', (deck_name, deck_name))
+        for front_norm, note_id, mod in rows:
+            groups.setdefault(front_norm, []).append((note_id, mod))
+        return groups
+
+    def stats(self, deck_name):
+        """Return {'notes', 'unique_fronts', 'duplicate_groups', 'last_sync'} for deck_name."""
+        notes, unique_fronts = self.db.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT front_hash) FROM notes WHERE deck = ?', (deck_name,)).fetchone()
+        duplicate_groups = self.db.execute(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM notes WHERE deck = ? GROUP BY front_hash HAVING COUNT(*) > 1)',
+            (deck_name,)).fetchone()[0]
+        return {'notes': notes, 'unique_fronts': unique_fronts, 'duplicate_groups': duplicate_groups,
+                'last_sync': self.last_sync(deck_name)}
+
+    def remove_notes(self, note_ids):
+        """Drop notes from the index after they were deleted in Anki."""
+        with self.db:
+            self.db.executemany('DELETE FROM notes WHERE note_id = ?', [(note_id,) for note_id in note_ids])
+
+def main():
+    """Main function."""
+    if len(sys.argv) < 2:
+        print("Usage: python anki_index.py <deck_name>")
+        print("Example: python anki_index.py '...IBAC25'")
+        print(f"\nSyncs the local index ({INDEX_PATH}) with the deck and prints deck statistics.")
+        sys.exit(1)
+
+    deck_name = sys.argv[1]
+
+    print(f"Ensuring Anki is running...")
+    if not ensure_anki_running():
+        print("Error: Could not start or connect to Anki. Please start Anki manually.", file=sys.stderr)
+        sys.exit(1)
+
+    index = DeckIndex()
+    try:
+        changes = index.sync(deck_name)
+    except Exception as e:
+        print(f"Error syncing index: {e}", file=sys.stderr)
+        sys.exit(1)
+    stats = index.stats(deck_name)
+    index.close()
+
+    print(f"Synced '{deck_name}': {changes['added']} added, {changes['updated']} updated, {changes['removed']} removed")
+    print(f"  Notes: {stats['notes']}")
+    print(f"  Unique fronts: {stats['unique_fronts']}")
+    print(f"  Duplicate groups: {stats['duplicate_groups']}")
+
+if __name__ == "__main__":
+    main()
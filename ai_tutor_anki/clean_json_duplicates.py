@@ -6,9 +6,73 @@ Removes duplicate cards from a JSON file, keeping only the first occurrence of e
 
 import sys
 import json
+import hashlib
 import os
+import re
+import tempfile
 from collections import OrderedDict
 
+_WHITESPACE_RE = re.compile(r'[ \t\n\r]*')
+
+def iter_json_array(f, read_size=65536):
+    """Yield the elements of the top-level JSON array in file object f one at a time.
+
+    The file is read read_size characters at a time and each element is decoded with
+    JSONDecoder.raw_decode, so only the current element and one read buffer are in memory.
+    Raises json.JSONDecodeError if the file is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(read_size)
+    pos = 0
+    eof = not buffer
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = '' if eof else f.read(read_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    state = 'start'
+    while True:
+        pos = _WHITESPACE_RE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if read_more():
+                continue
+            raise json.JSONDecodeError("Unexpected end of file", buffer, pos)
+        char = buffer[pos]
+        if state == 'start':
+            if char != '[':
+                raise json.JSONDecodeError("Expecting a JSON array", buffer, pos)
+            pos += 1
+            state = 'first'
+        elif state == 'separator':
+            if char == ']':
+                return
+            if char != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", buffer, pos)
+            pos += 1
+            state = 'value'
+        else:
+            if state == 'first' and char == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Most likely the element is cut off at the end of the buffer
+                if read_more():
+                    continue
+                raise
+            # A number could continue past the end of the buffer, decode it again with more text
+            if end == len(buffer) and read_more():
+                continue
+            yield value
+            pos = end
+            state = 'separator'
+
 def clean_json_duplicates(input_file, output_file=None):
     """Remove duplicates from JSON file, keeping first occurrence of each unique front text."""
     
@@ -77,24 +141,107 @@ def clean_json_duplicates(input_file, output_file=None):
         print(f"Error: {e}")
         return False
 
+def clean_json_duplicates_streaming(input_file, output_file=None, write_batch_size=1000):
+    """Streaming version of clean_json_duplicates for files too large to load at once.
+
+    Cards are parsed one at a time, only a 16-byte digest of each kept front is remembered,
+    and unique cards are written to a temporary file as they are found. The temporary file
+    is renamed over the output only once the whole input was processed, so a failure never
+    leaves a half-written output behind. Cards are encoded write_batch_size at a time, which
+    keeps the output identical to json.dump(..., indent=2) without per-card encoder overhead.
+    """
+    
+    if not os.path.exists(input_file):
+        print(f"Error: File '{input_file}' not found.")
+        return False
+    
+    target_file = output_file or input_file
+    temp_fd, temp_path = tempfile.mkstemp(suffix='.json.tmp', dir=os.path.dirname(os.path.abspath(target_file)))
+    
+    try:
+        seen_digests = set()
+        total = kept = removed = 0
+        encoder = json.JSONEncoder(indent=2, ensure_ascii=False)
+        pending = []
+        
+        def write_pending():
+            # encode() gives '[\n  {...},\n  {...}\n]'; keep only the elements
+            f_out.write((',' if kept > len(pending) else '') + encoder.encode(pending)[1:-2])
+            pending.clear()
+        
+        with open(input_file, 'r', encoding='utf-8') as f_in, os.fdopen(temp_fd, 'w', encoding='utf-8') as f_out:
+            f_out.write('[')
+            for i, card in enumerate(iter_json_array(f_in)):
+                total += 1
+                if not isinstance(card, dict) or 'front' not in card:
+                    print(f"Warning: Card {i+1} missing 'front' field, skipping")
+                    continue
+                
+                front_text = card['front'].strip()
+                digest = hashlib.blake2b(front_text.encode('utf-8'), digest_size=16).digest()
+                
+                if digest in seen_digests:
+                    removed += 1
+                    print(f"  Duplicate card {i+1}: {front_text[:60] + '...' if len(front_text) > 60 else front_text}")
+                    continue
+                seen_digests.add(digest)
+                
+                pending.append(card)
+                kept += 1
+                if len(pending) >= write_batch_size:
+                    write_pending()
+            if pending:
+                write_pending()
+            f_out.write('\n]' if kept else ']')
+        
+        print(f"Original file: {total} cards")
+        print(f"After deduplication: {kept} unique cards")
+        print(f"Removed {removed} duplicate cards")
+        
+        if output_file is None:
+            # Keep the original as a backup, then move the cleaned file into place
+            backup_file = input_file.replace('.json', '_backup.json')
+            os.replace(input_file, backup_file)
+            print(f"\nBackup created: {backup_file}")
+        os.replace(temp_path, target_file)
+        
+        print(f"Cleaned file saved: {target_file}")
+        return True
+        
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON in file: {e}")
+        return False
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
 def main():
     """Main function."""
     if len(sys.argv) < 2:
-        print("Usage: python clean_json_duplicates.py <input_json_file> [output_json_file]")
+        print("Usage: python clean_json_duplicates.py <input_json_file> [output_json_file] [--stream]")
         print("Example: python clean_json_duplicates.py IBAC25cards.json")
         print("Example: python clean_json_duplicates.py IBAC25cards.json IBAC25cards_clean.json")
         print("\nIf no output file is specified, the input file will be overwritten (with backup)")
+        print("Use --stream for very large files: cards are deduplicated one at a time at constant memory per card.")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
+    stream = '--stream' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--stream']
+    input_file = args[0]
+    output_file = args[1] if len(args) > 1 else None
     
     print(f"Clean JSON Duplicates Script")
     print(f"Input file: {input_file}")
     print(f"Output file: {output_file or input_file + ' (with backup)'}")
     print("-" * 50)
     
-    success = clean_json_duplicates(input_file, output_file)
+    if stream:
+        success = clean_json_duplicates_streaming(input_file, output_file)
+    else:
+        success = clean_json_duplicates(input_file, output_file)
     
     if success:
         print(f"\n🎉 JSON file cleaned successfully!")
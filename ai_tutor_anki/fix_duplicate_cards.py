@@ -1,15 +1,16 @@
 #!/usr/bin/env python3
 """
 Fix Duplicate Cards Script
-Temporarily allows duplicates to add cards that are stuck in Anki's duplicate detection.
+Adds cards that are stuck in Anki's duplicate detection by upserting them: cards whose front
+is already in the deck are updated in place, the rest are added with the duplicate check
+limited to the target deck, so "ghost" duplicates in other decks no longer block them.
 """
 
 import sys
 import json
 import os
-import requests
 from AnkiConnector import AnkiConnector
-from anki_utils import ensure_anki_running
+from anki_utils import ensure_anki_running, get_transport
 
 def load_json_cards(json_path):
     """Load and parse JSON cards from file (simplified version)."""
@@ -44,50 +45,35 @@ def load_json_cards(json_path):
 
 def create_deck_if_not_exists(deck_name):
     """Create the deck if it doesn't exist."""
+    transport = get_transport()
     try:
         # Check if deck exists
-        response = requests.post('http://localhost:8765', json={
-            'action': 'deckNames',
-            'version': 6
-        })
-        
-        if response.status_code == 200:
-            deck_names = response.json().get('result', [])
-            if deck_name not in deck_names:
-                print(f"Deck '{deck_name}' not found. Creating it...")
-                # Create the deck
-                create_response = requests.post('http://localhost:8765', json={
-                    'action': 'createDeck',
-                    'version': 6,
-                    'params': {
-                        'deck': deck_name
-                    }
-                })
-                
-                if create_response.status_code == 200:
-                    result = create_response.json()
-                    if result.get('error'):
-                        print(f"Error creating deck: {result.get('error')}")
-                        return False
-                    else:
-                        print(f"Successfully created deck '{deck_name}'")
-                        return True
-                else:
-                    print(f"Failed to create deck. HTTP status: {create_response.status_code}")
-                    return False
+        response_json = transport.invoke('deckNames')
+        if response_json.get('error'):
+            print(f"Failed to check existing decks: {response_json.get('error')}")
+            return False
+
+        deck_names = response_json.get('result', [])
+        if deck_name not in deck_names:
+            print(f"Deck '{deck_name}' not found. Creating it...")
+            # Create the deck
+            result = transport.invoke('createDeck', {'deck': deck_name})
+            if result.get('error'):
+                print(f"Error creating deck: {result.get('error')}")
+                return False
             else:
-                print(f"Deck '{deck_name}' already exists.")
+                print(f"Successfully created deck '{deck_name}'")
                 return True
         else:
-            print(f"Failed to check existing decks. HTTP status: {response.status_code}")
-            return False
+            print(f"Deck '{deck_name}' already exists.")
+            return True
             
     except Exception as e:
         print(f"Error checking/creating deck: {e}")
         return False
 
-def add_cards_with_duplicates_allowed(cards, deck_name="...IBAC25"):
-    """Add all cards to the specified Anki deck with duplicates allowed."""
+def upsert_cards_to_anki(cards, deck_name="...IBAC25", batch_size=50):
+    """Add or update all cards in the specified Anki deck, keyed on the front field."""
     print(f"Ensuring Anki is running...")
     if not ensure_anki_running():
         print("Error: Could not start or connect to Anki. Please start Anki manually.", file=sys.stderr)
@@ -99,52 +85,40 @@ def add_cards_with_duplicates_allowed(cards, deck_name="...IBAC25"):
         return False
     
     print(f"Connecting to Anki deck: {deck_name}")
-    print(f"IMPORTANT: Using allow_duplicate=True to bypass duplicate detection")
+    connector = AnkiConnector(deck_name=deck_name, note_type="Basic", allow_duplicate=False)
     
-    # Use AnkiConnector with allow_duplicate=True
-    connector = AnkiConnector(deck_name=deck_name, note_type="Basic", allow_duplicate=True)
-    
-    success_count = 0
+    print(f"Upserting {len(cards)} cards in batches of {batch_size}...")
+    results = connector.upsert_cards(cards, batch_size=batch_size, verify=True)
+
+    counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
     failed_count = 0
-    
-    for i, card in enumerate(cards, 1):
-        front = card["front"]
-        back = card["back"]
-        source = card.get("source", "")
-        
-        print(f"Adding card {i}/{len(cards)}: {front[:50]}...")
-        
-        try:
-            success = connector.add_card(front, back, source)
-            if success:
-                success_count += 1
-                print(f"  ✓ Successfully added card {i}")
-            else:
-                failed_count += 1
-                print(f"  ✗ Failed to add card {i}")
-        except Exception as e:
+
+    for i, (card, result) in enumerate(zip(cards, results), 1):
+        if result['error']:
             failed_count += 1
-            print(f"  ✗ Error adding card {i}: {e}")
+            print(f"  ✗ Failed to {'update' if result['action'] == 'updated' else 'add'} card {i}: "
+                  f"{card['front'][:50]}... ({result['error']})")
+        else:
+            counts[result['action']] += 1
     
     print(f"\nResults:")
-    print(f"  Successfully added: {success_count} cards")
-    print(f"  Failed to add: {failed_count} cards")
+    print(f"  Added: {counts['added']} cards")
+    print(f"  Updated in place: {counts['updated']} cards")
+    print(f"  Already up to date: {counts['unchanged']} cards")
+    print(f"  Skipped (front repeated in JSON): {counts['skipped']} cards")
+    print(f"  Failed: {failed_count} cards")
+    print(f"  Verified in Anki: {sum(1 for r in results if r.get('verified'))}/{counts['added']} added cards")
     print(f"  Total processed: {len(cards)} cards")
     
-    if success_count > 0:
-        print(f"\n🎉 Successfully added {success_count} cards to Anki deck '{deck_name}'!")
-        print(f"Note: These cards were added with duplicate detection disabled.")
-        print(f"Future cards will use normal duplicate detection unless you modify the script.")
-    
     return failed_count == 0
 
 def main():
-    """Main function to process JSON file and add cards to Anki with duplicates allowed."""
+    """Main function to process JSON file and upsert its cards into Anki."""
     if len(sys.argv) < 2:
         print("Usage: python fix_duplicate_cards.py <json_file_path> [deck_name]")
         print("Example: python fix_duplicate_cards.py IBAC25cards.json")
         print("Example: python fix_duplicate_cards.py IBAC25cards.json MyCustomDeck")
-        print("\nThis script temporarily allows duplicates to bypass the duplicate detection issue.")
+        print("\nCards already in the deck are updated in place, the rest are added; re-running it is safe.")
         sys.exit(1)
     
     json_path = sys.argv[1]
@@ -153,7 +127,7 @@ def main():
     print(f"Fix Duplicate Cards Script")
     print(f"JSON file: {json_path}")
     print(f"Target deck: {deck_name}")
-    print(f"Mode: ALLOW DUPLICATES (bypasses duplicate detection)")
+    print(f"Mode: UPSERT (update matching fronts, add the rest)")
     print("-" * 50)
     
     # Load cards from JSON
@@ -163,11 +137,11 @@ def main():
     
     print(f"Loaded {len(cards)} valid cards from JSON file.")
     
-    # Add cards to Anki with duplicates allowed
-    success = add_cards_with_duplicates_allowed(cards, deck_name)
+    # Add or update cards in Anki
+    success = upsert_cards_to_anki(cards, deck_name)
     
     if success:
-        print(f"\n🎉 All cards successfully added to Anki deck '{deck_name}'!")
+        print(f"\n🎉 Anki deck '{deck_name}' is up to date with all cards!")
         sys.exit(0)
     else:
         print(f"\n⚠️  Some cards failed to be added. Check the output above for details.")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Detection
+MinHash signatures with locality-sensitive hashing for finding cards whose fronts differ only
+by HTML, punctuation, case or a reworded clause, in sub-quadratic time.
+
+Signatures use one-permutation hashing (each shingle is hashed once and lands in one of
+NUM_BINS bins) with rotation densification, so building a signature costs O(shingles)
+instead of O(shingles * permutations).
+"""
+
+import re
+import zlib
+from array import array
+from anki_utils import normalize_front
+
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+DEFAULT_THRESHOLD = 0.6  # One reworded clause in a ~15 word front scores about 0.65
+MAX_BUCKET_PAIRS = 50  # Buckets larger than this are compared against their first member only
+
+_EMPTY = 0xFFFFFFFF
+_PUNCTUATION_RE = re.compile(r'[^\w\s]+')
+
+def shingles(front, size=2):
+    """Word shingles of the normalized front, with punctuation removed."""
+    words = _PUNCTUATION_RE.sub(' ', normalize_front(front)).split()
+    if len(words) < size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def signature(front):
+    """Return the MinHash signature of front as an array of NUM_BINS unsigned ints, or None if it has no words."""
+    bins = [_EMPTY] * NUM_BINS
+    for shingle in shingles(front):
+        h = zlib.crc32(shingle.encode('utf-8'))
+        b = h % NUM_BINS
+        v = h // NUM_BINS
+        if v < bins[b]:
+            bins[b] = v
+    if bins.count(_EMPTY) == NUM_BINS:
+        return None
+    # Densify: an empty bin borrows the value of the next non-empty bin, tagged with the
+    # distance in the top bits (bin values use at most 26 bits) so it cannot equal a real value.
+    # Walking backwards twice around the ring finds every empty bin's next non-empty bin in O(bins).
+    original = bins[:]
+    next_value = None
+    distance = 0
+    for i in range(2 * NUM_BINS - 1, -1, -1):
+        value = original[i % NUM_BINS]
+        if value != _EMPTY:
+            next_value = value
+            distance = 0
+        else:
+            distance += 1
+            if i < NUM_BINS and next_value is not None:
+                bins[i] = (distance << 26) | next_value
+    return array('I', bins)
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures (fraction of equal bins)."""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / NUM_BINS
+
+def find_clusters(signatures, threshold=DEFAULT_THRESHOLD):
+    """Cluster signatures whose estimated similarity is at least threshold.
+
+    signatures is a list of signature arrays (None entries are skipped). Candidates come from
+    LSH buckets (BANDS bands of ROWS bins) and are confirmed with similarity() before being
+    merged with union-find. Returns a list of clusters, each a list of indexes into signatures,
+    containing only clusters with more than one member.
+
+    Clusters are single-linkage: a chain of small rewrites links fronts that are not similar
+    to each other. Pass a cluster to center_clusters before acting on it as a whole.
+    """
+    parent = list(range(len(signatures)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[root_j] = root_i
+
+    for band in range(BANDS):
+        start = band * ROWS
+        buckets = {}
+        for i, sig in enumerate(signatures):
+            if sig is not None:
+                buckets.setdefault(sig[start:start + ROWS].tobytes(), []).append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) <= MAX_BUCKET_PAIRS:
+                pairs = ((a, b) for n, a in enumerate(members) for b in members[n + 1:])
+            else:
+                pairs = ((members[0], b) for b in members[1:])
+            for a, b in pairs:
+                if find(a) != find(b) and similarity(signatures[a], signatures[b]) >= threshold:
+                    union(a, b)
+
+    clusters = {}
+    for i, sig in enumerate(signatures):
+        if sig is not None:
+            clusters.setdefault(find(i), []).append(i)
+    return [members for members in clusters.values() if len(members) > 1]
+
+def center_clusters(members, signatures, threshold=DEFAULT_THRESHOLD):
+    """Split a cluster from find_clusters into groups built around a center.
+
+    members are in priority order; the first remaining member becomes a center and takes every
+    remaining member at least threshold similar to it, then the rest are grouped the same way.
+    Returns groups (center first) with more than one member; members left alone are dropped.
+    """
+    groups = []
+    remaining = list(members)
+    while len(remaining) > 1:
+        center = signatures[remaining[0]]
+        group = [remaining[0]]
+        rest = []
+        for i in remaining[1:]:
+            (group if similarity(center, signatures[i]) >= threshold else rest).append(i)
+        if len(group) > 1:
+            groups.append(group)
+        remaining = rest
+    return groups
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Note Records
+Compact per-note records and CSV reports for the duplicate tools. A deck scan keeps one
+slotted NoteRecord (front digest, note id, mod time) per note instead of whole notesInfo
+dicts, and per-note details go to a CSV file rather than the terminal.
+"""
+
+import csv
+import os
+import re
+import time
+
+REPORT_DIR = os.path.expanduser('~/.cache/grammarpt/reports')
+SUMMARY_GROUPS = 10  # Duplicate groups shown on the console; the CSV report has all of them
+
+class NoteRecord:
+    """Front digest (bytes), note id and modification time of one note.
+
+    similarity is only set by the near-duplicate mode (estimated similarity to the kept note).
+    """
+    __slots__ = ('front_digest', 'note_id', 'mod', 'similarity')
+
+    def __init__(self, front_digest, note_id, mod, similarity=None):
+        self.front_digest = front_digest
+        self.note_id = note_id
+        self.mod = mod
+        self.similarity = similarity
+
+    def __repr__(self):
+        return f"NoteRecord(note_id={self.note_id}, mod={self.mod})"
+
+def default_report_path(tool, deck_name):
+    """Timestamped CSV path under REPORT_DIR for one run of tool against deck_name."""
+    deck_label = re.sub(r'[^\w.-]+', '_', deck_name).strip('_.') or 'deck'
+    return os.path.join(REPORT_DIR, f"{tool}_{deck_label}_{time.strftime('%Y%m%d-%H%M%S')}.csv")
+
+class CsvReport:
+    """CSV file that report rows are written to as they are produced, so no rows are kept in memory."""
+
+    def __init__(self, path, header):
+        self.path = path
+        self.rows = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, *row):
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
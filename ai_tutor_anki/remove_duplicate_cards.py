@@ -5,157 +5,194 @@ Finds and removes duplicate cards from an Anki deck, keeping only the most recen
 """
 
 import sys
-import requests
 from collections import defaultdict
-from anki_utils import ensure_anki_running
+from anki_utils import NOTES_INFO_CHUNK_SIZE, ensure_anki_running, front_digest, get_transport, iter_notes_info, normalize_front
+from anki_index import DeckIndex
+from note_records import SUMMARY_GROUPS, CsvReport, NoteRecord, default_report_path
+import near_duplicates
 
 def get_all_notes_in_deck(deck_name):
     """Get all note IDs in the specified deck."""
     try:
-        response = requests.post('http://localhost:8765', json={
-            'action': 'findNotes',
-            'version': 6,
-            'params': {
-                'query': f'deck:"{deck_name}"'
-            }
-        })
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('error'):
-                print(f"Error finding notes: {result.get('error')}")
-                return []
-            return result.get('result', [])
-        else:
-            print(f"HTTP error finding notes: {response.status_code}")
+        result = get_transport().invoke('findNotes', {'query': f'deck:"{deck_name}"'})
+        if result.get('error'):
+            print(f"Error finding notes: {result.get('error')}")
             return []
+        return result.get('result', [])
             
     except Exception as e:
         print(f"Exception finding notes: {e}")
         return []
 
-def get_notes_info(note_ids):
-    """Get detailed information about specific notes."""
-    try:
-        response = requests.post('http://localhost:8765', json={
-            'action': 'notesInfo',
-            'version': 6,
-            'params': {
-                'notes': note_ids
-            }
-        })
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('error'):
-                print(f"Error getting notes info: {result.get('error')}")
-                return []
-            return result.get('result', [])
-        else:
-            print(f"HTTP error getting notes info: {response.status_code}")
-            return []
-            
-    except Exception as e:
-        print(f"Exception getting notes info: {e}")
-        return []
-
 def delete_notes(note_ids):
     """Delete specific notes from Anki."""
     try:
-        response = requests.post('http://localhost:8765', json={
-            'action': 'deleteNotes',
-            'version': 6,
-            'params': {
-                'notes': note_ids
-            }
-        })
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get('error'):
-                print(f"Error deleting notes: {result.get('error')}")
-                return False
-            return True
-        else:
-            print(f"HTTP error deleting notes: {response.status_code}")
+        result = get_transport().invoke('deleteNotes', {'notes': note_ids})
+        if result.get('error'):
+            print(f"Error deleting notes: {result.get('error')}")
             return False
+        return True
             
     except Exception as e:
         print(f"Exception deleting notes: {e}")
         return False
 
-def find_and_remove_duplicates(deck_name, dry_run=True):
-    """Find and remove duplicate cards, keeping the most recent copy."""
-    print(f"Searching for duplicate cards in deck: {deck_name}")
-    print(f"Mode: {'DRY RUN (no changes will be made)' if dry_run else 'LIVE MODE (duplicates will be deleted)'}")
-    print("-" * 60)
-    
+def group_notes_from_anki(deck_name, chunk_size=NOTES_INFO_CHUNK_SIZE):
+    """Stream the deck's notes from Anki and return (total_notes, unique_fronts, duplicate_groups).
+
+    notesInfo is fetched chunk_size notes at a time and only a NoteRecord (front digest, note id,
+    mod) is kept per note, so memory stays flat as the deck grows. Fronts are compared normalized
+    (front_digest, the same key as the --index mode). duplicate_groups is a list of
+    (front label, [NoteRecord, ...]) for fronts that appear more than once.
+    """
     # Get all notes in the deck
     note_ids = get_all_notes_in_deck(deck_name)
     if not note_ids:
-        print("No notes found in the deck.")
-        return True
+        return 0, 0, []
     
     print(f"Found {len(note_ids)} total notes in deck")
     
-    # Get detailed info for all notes
-    print("Retrieving note details...")
-    notes_info = get_notes_info(note_ids)
-    if not notes_info:
-        print("Could not retrieve note information.")
-        return False
-    
     # Group notes by front field content to identify duplicates
+    print(f"Retrieving note details in chunks of {chunk_size}...")
     front_to_notes = defaultdict(list)
+    labels = {}  # Display text, only kept for fronts seen more than once
+    total_notes = 0
+    try:
+        for note_info in iter_notes_info(note_ids, chunk_size):
+            total_notes += 1
+            front_field = note_info.get('fields', {}).get('Front', {}).get('value', '').strip()
+            # Only process notes with text on the front (an image-only front normalizes to nothing)
+            if not normalize_front(front_field):
+                continue
+            key = front_digest(front_field)
+            notes = front_to_notes[key]
+            notes.append(NoteRecord(key, note_info.get('noteId'), note_info.get('mod', 0)))
+            if len(notes) == 2:
+                labels[key] = front_field[:50]
+    except RuntimeError as e:
+        print(f"Could not retrieve note information: {e}")
+        return None
     
-    for note_info in notes_info:
-        note_id = note_info.get('noteId')
-        fields = note_info.get('fields', {})
-        front_field = fields.get('Front', {}).get('value', '').strip()
-        mod_time = note_info.get('mod', 0)  # Modification time
-        
-        if front_field:  # Only process notes with non-empty front fields
-            front_to_notes[front_field].append({
-                'note_id': note_id,
-                'mod_time': mod_time,
-                'note_info': note_info
-            })
+    duplicate_groups = [(labels[key], notes) for key, notes in front_to_notes.items() if len(notes) > 1]
+    return total_notes, len(front_to_notes), duplicate_groups
+
+def group_notes_from_index(deck_name, index):
+    """Sync the local index and return (total_notes, unique_fronts, duplicate_groups) like group_notes_from_anki."""
+    print("Syncing local deck index...")
+    try:
+        changes = index.sync(deck_name)
+    except Exception as e:
+        print(f"Error syncing index: {e}")
+        return None
+    print(f"Index synced: {changes['added']} added, {changes['updated']} updated, {changes['removed']} removed")
+    stats = index.stats(deck_name)
+    duplicate_groups = [(front_norm[:50], [NoteRecord(None, note_id, mod) for note_id, mod in notes])
+                        for front_norm, notes in index.duplicate_groups(deck_name).items() if front_norm]
+    return stats['notes'], stats['unique_fronts'], duplicate_groups
+
+def group_notes_near(deck_name, threshold=near_duplicates.DEFAULT_THRESHOLD, chunk_size=NOTES_INFO_CHUNK_SIZE):
+    """Stream the deck's notes and cluster near-duplicate fronts with MinHash/LSH.
+
+    Returns (total_notes, clusters_and_singletons, duplicate_groups) like group_notes_from_anki, with
+    each NoteRecord's similarity set to its estimated Jaccard similarity to the newest note in its cluster.
+    Every member of a group is at least threshold similar to that newest (kept) note.
+    """
+    note_ids = get_all_notes_in_deck(deck_name)
+    if not note_ids:
+        return 0, 0, []
+    
+    print(f"Found {len(note_ids)} total notes in deck")
+    print(f"Retrieving note details in chunks of {chunk_size}...")
+    notes = []
+    labels = []
+    signatures = []
+    try:
+        for note_info in iter_notes_info(note_ids, chunk_size):
+            front_field = note_info.get('fields', {}).get('Front', {}).get('value', '')
+            notes.append(NoteRecord(None, note_info.get('noteId'), note_info.get('mod', 0)))
+            labels.append(front_field.strip()[:50])
+            signatures.append(near_duplicates.signature(front_field))
+    except RuntimeError as e:
+        print(f"Could not retrieve note information: {e}")
+        return None
+    
+    print(f"Clustering {len(notes)} fronts (similarity threshold {threshold})...")
+    groups = []
+    for members in near_duplicates.find_clusters(signatures, threshold):
+        members.sort(key=lambda i: notes[i].mod, reverse=True)
+        groups.extend(near_duplicates.center_clusters(members, signatures, threshold))
+    duplicate_groups = []
+    for members in groups:
+        newest = signatures[members[0]]
+        for i in members:
+            notes[i].similarity = near_duplicates.similarity(newest, signatures[i])
+        duplicate_groups.append((labels[members[0]], [notes[i] for i in members]))
+    unique_fronts = len(notes) - sum(len(members) - 1 for members in groups)
+    return len(notes), unique_fronts, duplicate_groups
+
+def find_and_remove_duplicates(deck_name, dry_run=True, use_index=False, chunk_size=NOTES_INFO_CHUNK_SIZE,
+                               near_threshold=None, report_path=None):
+    """Find and remove duplicate cards, keeping the most recent copy.
+
+    Every kept and deleted note is written to a CSV report (report_path, or a timestamped file
+    under ~/.cache/grammarpt/reports); the console only gets a summary.
+
+    With use_index=True duplicates are found in the local SQLite index (see anki_index.py),
+    which is synced incrementally instead of re-reading every note from Anki.
+    With near_threshold set, fronts are clustered by MinHash similarity (see near_duplicates.py)
+    instead of exact equality.
+    """
+    print(f"Searching for duplicate cards in deck: {deck_name}")
+    print(f"Mode: {'DRY RUN (no changes will be made)' if dry_run else 'LIVE MODE (duplicates will be deleted)'}")
+    print("-" * 60)
+    
+    index = DeckIndex() if use_index else None
+    if near_threshold is not None:
+        grouped = group_notes_near(deck_name, near_threshold, chunk_size)
+    elif index:
+        grouped = group_notes_from_index(deck_name, index)
+    else:
+        grouped = group_notes_from_anki(deck_name, chunk_size)
+    if grouped is None:
+        return False
+    total_notes, unique_fronts, duplicate_groups = grouped
+    if total_notes == 0:
+        print("No notes found in the deck.")
+        return True
     
     # Find duplicates
     duplicates_to_delete = []
-    unique_fronts = 0
-    duplicate_groups = 0
+    report_path = report_path or default_report_path('remove_duplicates', deck_name)
     
-    for front_text, notes_list in front_to_notes.items():
-        unique_fronts += 1
-        if len(notes_list) > 1:
-            duplicate_groups += 1
-            # Sort by modification time (newest first)
-            notes_list.sort(key=lambda x: x['mod_time'], reverse=True)
-            
-            # Keep the newest, mark others for deletion
-            keep_note = notes_list[0]
-            delete_notes_list = notes_list[1:]
-            
-            print(f"\nDuplicate group found: {front_text[:50]}...")
-            print(f"  Total copies: {len(notes_list)}")
-            print(f"  Keeping newest: Note ID {keep_note['note_id']} (mod: {keep_note['mod_time']})")
+    with CsvReport(report_path, ['group', 'front', 'note_id', 'mod', 'action', 'similarity']) as report:
+        for group_number, (front_text, notes_list) in enumerate(duplicate_groups, 1):
+            # Sort by modification time (newest first); keep the newest, mark others for deletion
+            notes_list.sort(key=lambda note: note.mod, reverse=True)
+            if group_number <= SUMMARY_GROUPS:
+                print(f"Duplicate group: {front_text[:50]}... ({len(notes_list)} copies, keeping note {notes_list[0].note_id})")
             
-            for delete_note in delete_notes_list:
-                print(f"  Will delete: Note ID {delete_note['note_id']} (mod: {delete_note['mod_time']})")
-                duplicates_to_delete.append(delete_note['note_id'])
+            for position, note in enumerate(notes_list):
+                similarity = f"{note.similarity:.2f}" if note.similarity is not None else ''
+                report.write(group_number, front_text, note.note_id, note.mod, 'keep' if position == 0 else 'delete', similarity)
+                if position:
+                    duplicates_to_delete.append(note.note_id)
+    if len(duplicate_groups) > SUMMARY_GROUPS:
+        print(f"... and {len(duplicate_groups) - SUMMARY_GROUPS} more groups")
     
     print(f"\nSummary:")
-    print(f"  Total notes in deck: {len(notes_info)}")
+    print(f"  Total notes in deck: {total_notes}")
     print(f"  Unique front texts: {unique_fronts}")
-    print(f"  Duplicate groups found: {duplicate_groups}")
+    print(f"  Duplicate groups found: {len(duplicate_groups)}")
     print(f"  Duplicate notes to delete: {len(duplicates_to_delete)}")
+    print(f"  Report: {report_path} ({report.rows} rows)")
     
     if duplicates_to_delete and not dry_run:
         print(f"\nDeleting {len(duplicates_to_delete)} duplicate notes...")
         if delete_notes(duplicates_to_delete):
+            if index:
+                index.remove_notes(duplicates_to_delete)
             print(f"✓ Successfully deleted {len(duplicates_to_delete)} duplicate notes")
-            print(f"✓ Your deck now has {len(notes_info) - len(duplicates_to_delete)} unique cards")
+            print(f"✓ Your deck now has {total_notes - len(duplicates_to_delete)} unique cards")
             return True
         else:
             print(f"✗ Failed to delete duplicate notes")
@@ -171,14 +208,44 @@ def find_and_remove_duplicates(deck_name, dry_run=True):
 def main():
     """Main function."""
     if len(sys.argv) < 2:
-        print("Usage: python remove_duplicate_cards.py <deck_name> [--live]")
+        print("Usage: python remove_duplicate_cards.py <deck_name> [--live] [--index] [--chunk-size N] [--near [THRESHOLD]] [--report FILE.csv]")
         print("Example: python remove_duplicate_cards.py '...IBAC25'")
         print("Example: python remove_duplicate_cards.py '...IBAC25' --live")
         print("\nBy default, runs in DRY RUN mode. Use --live to actually delete duplicates.")
+        print("Use --index to find duplicates in the local deck index (normalized fronts, incremental sync).")
+        print(f"--chunk-size sets how many notes are fetched per notesInfo request (default {NOTES_INFO_CHUNK_SIZE}).")
+        print(f"Use --near to also catch fronts that differ by HTML, punctuation, case or rewording "
+              f"(MinHash similarity, default threshold {near_duplicates.DEFAULT_THRESHOLD}).")
+        print("Every kept and deleted note is listed in a CSV report (--report, default under ~/.cache/grammarpt/reports).")
         sys.exit(1)
     
     deck_name = sys.argv[1]
     dry_run = '--live' not in sys.argv
+    use_index = '--index' in sys.argv
+    chunk_size = NOTES_INFO_CHUNK_SIZE
+    if '--chunk-size' in sys.argv:
+        try:
+            chunk_size = int(sys.argv[sys.argv.index('--chunk-size') + 1])
+        except (IndexError, ValueError):
+            print("Error: --chunk-size needs a number", file=sys.stderr)
+            sys.exit(1)
+    report_path = None
+    if '--report' in sys.argv:
+        try:
+            report_path = sys.argv[sys.argv.index('--report') + 1]
+        except IndexError:
+            print("Error: --report needs a file path", file=sys.stderr)
+            sys.exit(1)
+    near_threshold = None
+    if '--near' in sys.argv:
+        near_threshold = near_duplicates.DEFAULT_THRESHOLD
+        near_index = sys.argv.index('--near') + 1
+        if near_index < len(sys.argv) and not sys.argv[near_index].startswith('--'):
+            try:
+                near_threshold = float(sys.argv[near_index])
+            except ValueError:
+                print("Error: --near threshold must be a number between 0 and 1", file=sys.stderr)
+                sys.exit(1)
     
     print(f"Remove Duplicate Cards Script")
     print(f"Target deck: {deck_name}")
@@ -192,7 +259,7 @@ def main():
         sys.exit(1)
     
     # Find and remove duplicates
-    success = find_and_remove_duplicates(deck_name, dry_run)
+    success = find_and_remove_duplicates(deck_name, dry_run, use_index, chunk_size, near_threshold, report_path)
     
     if success:
         if dry_run:
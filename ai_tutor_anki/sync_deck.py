@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Sync Deck Script
+Makes an Anki deck mirror a JSON card file: one pass over the deck computes the cards to add,
+the notes whose fields changed (updated in place with updateNoteFields) and, optionally, the
+notes that are no longer in the file, then applies them as batched requests.
+"""
+
+import sys
+from collections import defaultdict
+import requests
+from AnkiConnector import AnkiConnector
+from anki_utils import NOTES_INFO_CHUNK_SIZE, deck_notes_query, ensure_anki_running, front_hash, get_transport, iter_notes_info
+from ai_tutor_json_to_anki import create_deck_if_not_exists, load_json_cards
+
+def fetch_deck_notes(deck_name, note_type="Basic", chunk_size=NOTES_INFO_CHUNK_SIZE):
+    """Return {front_hash: [(note_id, mod, {field: value}), ...] newest first} for the deck's note_type notes.
+
+    Notes in subdecks and notes of other note types are left out (see deck_notes_query), so
+    --delete never touches them.
+    """
+    note_ids = get_transport().request('findNotes', {'query': deck_notes_query(deck_name, note_type)}, timeout=60)
+    deck_notes = defaultdict(list)
+    for note_info in iter_notes_info(note_ids, chunk_size):
+        fields = {name: field.get('value', '') for name, field in note_info.get('fields', {}).items()}
+        deck_notes[front_hash(fields.get('Front', ''))].append((note_info.get('noteId'), note_info.get('mod', 0), fields))
+    for notes in deck_notes.values():
+        notes.sort(key=lambda note: note[1], reverse=True)
+    return deck_notes
+
+def plan_sync(cards, deck_notes, connector, delete=False):
+    """Diff cards against deck_notes and return {'add', 'update', 'delete', 'unchanged'}.
+
+    Cards are matched to notes on their normalized front. A matched note is updated when the
+    fields the connector would write differ from what Anki has. With delete=True, notes whose
+    front is not in cards, and older extra copies of a front, are scheduled for deletion.
+    """
+    plan = {'add': [], 'update': [], 'delete': [], 'unchanged': 0}
+    matched = set()
+    for card in cards:
+        key = front_hash(card['front'])
+        if key in matched:
+            print(f"Warning: Skipping repeated front in JSON: {card['front'][:50]}...")
+            continue
+        matched.add(key)
+        notes = deck_notes.get(key)
+        if not notes:
+            plan['add'].append(card)
+            continue
+        note_id, _, fields = notes[0]
+        wanted = connector._build_note(card['front'], card['back'], card.get('source', ''))['fields']
+        if any(fields.get(name, '') != value for name, value in wanted.items()):
+            plan['update'].append((note_id, card))
+        else:
+            plan['unchanged'] += 1
+    if delete:
+        for key, notes in deck_notes.items():
+            extra = notes if key not in matched else notes[1:]
+            plan['delete'].extend((note_id, fields.get('Front', '')) for note_id, _, fields in extra)
+    return plan
+
+def print_plan(plan):
+    for card in plan['add']:
+        print(f"  + Add: {card['front'][:60]}...")
+    for note_id, card in plan['update']:
+        print(f"  ~ Update note {note_id}: {card['front'][:60]}...")
+    for note_id, front in plan['delete']:
+        print(f"  - Delete note {note_id}: {front[:60]}...")
+    print(f"\nPlan:")
+    print(f"  Cards to add: {len(plan['add'])}")
+    print(f"  Notes to update: {len(plan['update'])}")
+    print(f"  Notes to delete: {len(plan['delete'])}")
+    print(f"  Unchanged: {plan['unchanged']}")
+
+def apply_plan(connector, plan, batch_size=50):
+    """Apply a plan from plan_sync; return True if every change went through."""
+    failed = 0
+    if plan['update']:
+        print(f"Updating {len(plan['update'])} notes in batches of {batch_size}...")
+        for (note_id, card), result in zip(plan['update'], connector.update_cards(plan['update'], batch_size)):
+            if result['error']:
+                failed += 1
+                print(f"  ✗ Failed to update note {note_id}: {card['front'][:50]}... ({result['error']})")
+    if plan['add']:
+        print(f"Adding {len(plan['add'])} cards in batches of {batch_size}...")
+        # The plan only looks at this deck, so a front that is also in a subdeck or another deck
+        # must not count as a duplicate, or it would be planned (and rejected) on every run
+        for card, result in zip(plan['add'], connector.add_cards(plan['add'], batch_size, duplicate_scope='deck')):
+            if result['note_id'] is None:
+                failed += 1
+                print(f"  ✗ Failed to add card: {card['front'][:50]}... ({result['error']})")
+    if plan['delete']:
+        print(f"Deleting {len(plan['delete'])} notes...")
+        try:
+            get_transport().request('deleteNotes', {'notes': [note_id for note_id, _ in plan['delete']]}, timeout=60)
+        except Exception as e:
+            failed += len(plan['delete'])
+            print(f"  ✗ Failed to delete notes: {e}")
+    print(f"\nApplied: {len(plan['add']) + len(plan['update']) + len(plan['delete']) - failed} changes, {failed} failed")
+    return failed == 0
+
+def sync_deck(json_path, deck_name="...IBAC25", dry_run=True, delete=False, chunk_size=NOTES_INFO_CHUNK_SIZE, batch_size=50):
+    """Diff json_path against deck_name, print the plan and apply it unless dry_run."""
+    cards = load_json_cards(json_path)
+    if cards is None:
+        return False
+    print(f"Loaded {len(cards)} valid cards from JSON file.")
+
+    if not create_deck_if_not_exists(deck_name):
+        print(f"Error: Could not create or access deck '{deck_name}'", file=sys.stderr)
+        return False
+    connector = AnkiConnector(deck_name=deck_name, note_type="Basic", allow_duplicate=False)
+
+    print(f"Reading deck notes in chunks of {chunk_size}...")
+    try:
+        deck_notes = fetch_deck_notes(deck_name, connector.note_type, chunk_size)
+    except (requests.RequestException, RuntimeError, ValueError) as e:
+        print(f"Error retrieving deck notes: {e}")
+        return False
+    print(f"Deck has {sum(len(notes) for notes in deck_notes.values())} notes")
+
+    plan = plan_sync(cards, deck_notes, connector, delete)
+    print_plan(plan)
+
+    if not (plan['add'] or plan['update'] or plan['delete']):
+        print(f"\nDeck is already in sync")
+        return True
+    if dry_run:
+        print(f"\nDRY RUN: No changes made")
+        print("Run with --live to apply the plan")
+        return True
+    return apply_plan(connector, plan, batch_size)
+
+def main():
+    """Main function."""
+    if len(sys.argv) < 2:
+        print("Usage: python sync_deck.py <json_file_path> [deck_name] [--live] [--delete] [--chunk-size N]")
+        print("Example: python sync_deck.py IBAC25cards.json")
+        print("Example: python sync_deck.py IBAC25cards.json '...IBAC25' --live --delete")
+        print("\nBy default, runs in DRY RUN mode and only prints the plan. Use --live to apply it.")
+        print("Use --delete to also remove notes that are not in the JSON file (and extra copies of a front).")
+        print(f"--chunk-size sets how many notes are fetched per notesInfo request (default {NOTES_INFO_CHUNK_SIZE}).")
+        sys.exit(1)
+
+    json_path = sys.argv[1]
+    deck_name = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith('--') else "...IBAC25"
+    dry_run = '--live' not in sys.argv
+    delete = '--delete' in sys.argv
+    chunk_size = NOTES_INFO_CHUNK_SIZE
+    if '--chunk-size' in sys.argv:
+        try:
+            chunk_size = int(sys.argv[sys.argv.index('--chunk-size') + 1])
+        except (IndexError, ValueError):
+            print("Error: --chunk-size needs a number", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"Sync Deck Script")
+    print(f"JSON file: {json_path}")
+    print(f"Target deck: {deck_name}")
+    print(f"Mode: {'DRY RUN' if dry_run else 'LIVE'}{' (with deletes)' if delete else ''}")
+    print("-" * 50)
+
+    # Ensure Anki is running
+    print(f"Ensuring Anki is running...")
+    if not ensure_anki_running():
+        print("Error: Could not start or connect to Anki. Please start Anki manually.", file=sys.stderr)
+        sys.exit(1)
+
+    success = sync_deck(json_path, deck_name, dry_run, delete, chunk_size)
+
+    if success:
+        if dry_run:
+            print(f"\n✓ Dry run completed successfully")
+        else:
+            print(f"\n🎉 Deck '{deck_name}' now mirrors {json_path}")
+    else:
+        print(f"\n⚠️ Sync failed. Check the output above for details.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,249 @@
+import atexit
+import hashlib
+import html
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
 import subprocess
+import sys
 import time
+from collections import deque
 import requests
+from requests.adapters import HTTPAdapter
+
+ANKI_CONNECT_URL = os.environ.get('ANKI_CONNECT_URL', 'http://localhost:8765')
+ANKI_CONNECT_VERSION = 6
+DEFAULT_TIMEOUT = 10  # seconds; large batches can pass a longer per-call timeout
+NOTES_INFO_CHUNK_SIZE = 500
+REQUEST_LOG_PATH = os.path.expanduser('~/.cache/grammarpt/ankiconnect.log')
+
+class RequestLog:
+    """Structured log of AnkiConnect requests and responses.
+
+    Keeps the last max_entries records in memory for querying after a batch, and hands
+    them to a background thread that appends JSON lines to a size-rotated file, so
+    callers never wait on disk I/O. 'multi' requests are logged once per sub-action.
+    """
+
+    def __init__(self, path=REQUEST_LOG_PATH, max_entries=1000, max_bytes=1_000_000, backup_count=3):
+        self.path = path
+        self.entries_buffer = deque(maxlen=max_entries)
+        self.logger = logging.getLogger('ankiconnect.requests')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.listener = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes,
+                                                                backupCount=backup_count, encoding='utf-8')
+            file_handler.setFormatter(logging.Formatter('%(message)s'))
+            log_queue = queue.SimpleQueue()
+            self.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            self.listener = logging.handlers.QueueListener(log_queue, file_handler)
+            self.listener.start()
+            atexit.register(self.listener.stop)
+        except OSError as e:
+            print(f"Could not open AnkiConnect request log {path}: {e}")
+
+    def record(self, action, params, response_json=None, error=None, duration=None):
+        if action == 'multi' and response_json and isinstance(response_json.get('result'), list):
+            for sub_action, sub_response in zip((params or {}).get('actions', []), response_json['result']):
+                if not isinstance(sub_response, dict):
+                    sub_response = {'result': sub_response, 'error': None}
+                self._append(sub_action.get('action'), sub_action.get('params'), sub_response, None, duration, 'multi')
+            return
+        self._append(action, params, response_json, error, duration, None)
+
+    def _append(self, action, params, response_json, error, duration, parent):
+        if error is None and response_json:
+            error = response_json.get('error')
+        entry = {
+            'time': time.time(),
+            'action': action,
+            'params': _summarize(params),
+            'result': _summarize(response_json.get('result')) if response_json else None,
+            'error': str(error) if error else None,
+            'duration_ms': round(duration * 1000, 1) if duration is not None else None,
+        }
+        if parent:
+            entry['parent'] = parent
+        self.entries_buffer.append(entry)
+        if self.listener:
+            self.logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def entries(self, errors_only=False, action=None):
+        """Return buffered entries, newest last, optionally only failures and/or one action."""
+        return [entry for entry in self.entries_buffer
+                if (not errors_only or entry['error']) and (action is None or entry['action'] == action)]
+
+def _summarize(value, depth=0):
+    """Compact a request/response payload for the log without serializing large payloads.
+
+    Note fronts are kept so failed cards can be identified; long lists and strings are cut.
+    """
+    if isinstance(value, dict) and isinstance(value.get('note'), dict):
+        note = value['note']
+        return {'deck': note.get('deckName'), 'front': str(note.get('fields', {}).get('Front', ''))[:100]}
+    if isinstance(value, str):
+        return value if len(value) <= 200 else value[:200] + '...'
+    if isinstance(value, list):
+        if len(value) > 10 or depth >= 2:
+            return f"<{len(value)} items>"
+        return [_summarize(item, depth + 1) for item in value]
+    if isinstance(value, dict):
+        if depth >= 2:
+            return f"<{len(value)} keys>"
+        return {key: _summarize(item, depth + 1) for key, item in value.items()}
+    return value
+
+def read_request_log(path=REQUEST_LOG_PATH, errors_only=False, since=None, action=None):
+    """Read logged entries back from disk (oldest rotated file first), e.g. after a failed batch.
+
+    since (a Unix time) keeps only newer entries; action keeps only that AnkiConnect action.
+    """
+    entries = []
+    paths = sorted((p for p in (f"{path}.{i}" for i in range(1, 10)) if os.path.exists(p)), reverse=True)
+    for log_path in paths + ([path] if os.path.exists(path) else []):
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if ((not errors_only or entry.get('error')) and (since is None or entry.get('time', 0) >= since)
+                        and (action is None or entry.get('action') == action)):
+                    entries.append(entry)
+    return entries
+
+_request_log = None
+
+def get_request_log():
+    """Return the process-wide RequestLog, creating it on first use."""
+    global _request_log
+    if _request_log is None:
+        _request_log = RequestLog()
+    return _request_log
+
+class AnkiTransport:
+    """Pooled keep-alive HTTP session for AnkiConnect.
+
+    All scripts share one instance (see get_transport) so the TCP connection to Anki
+    is reused across calls instead of being reopened for every request.
+    """
+
+    def __init__(self, url=ANKI_CONNECT_URL, timeout=DEFAULT_TIMEOUT, pool_size=4):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def invoke(self, action, params=None, timeout=None):
+        """Send one AnkiConnect action and return the decoded {'result', 'error'} dict.
+
+        Raises requests.RequestException on connection errors/timeouts and
+        ValueError if Anki answers with something that is not JSON.
+        """
+        payload = {'action': action, 'version': ANKI_CONNECT_VERSION}
+        if params is not None:
+            payload['params'] = params
+        started = time.monotonic()
+        try:
+            response = self.session.post(self.url, json=payload,
+                                         timeout=self.timeout if timeout is None else timeout)
+            response.raise_for_status()
+            try:
+                response_json = response.json()
+            except ValueError:
+                raise ValueError(f"AnkiConnect returned non-JSON response: {response.text}")
+        except (requests.RequestException, ValueError) as e:
+            get_request_log().record(action, params, error=e, duration=time.monotonic() - started)
+            raise
+        get_request_log().record(action, params, response_json, duration=time.monotonic() - started)
+        return response_json
+
+    def request(self, action, params=None, timeout=None):
+        """Like invoke, but return only 'result' and raise RuntimeError on an API error."""
+        response_json = self.invoke(action, params, timeout)
+        if response_json.get('error'):
+            raise RuntimeError(f"AnkiConnect API error ({action}): {response_json.get('error')}")
+        return response_json.get('result')
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def normalize_front(front):
+    """Normalize a Front field for duplicate matching: drop HTML tags and entities, casefold, collapse whitespace."""
+    text = html.unescape(_TAG_RE.sub(' ', front or ''))
+    return _WHITESPACE_RE.sub(' ', text).strip().casefold()
+
+def front_digest(front):
+    """16-byte blake2b digest of normalize_front(front), the compact in-memory duplicate key."""
+    return hashlib.blake2b(normalize_front(front).encode('utf-8'), digest_size=16).digest()
+
+def front_hash(front):
+    """Hex form of front_digest(front), used as the duplicate key in files and the deck index."""
+    return front_digest(front).hex()
+
+def _quote_search(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def deck_query(deck_name):
+    """findNotes query matching every note in deck_name, with quotes and backslashes escaped."""
+    return 'deck:' + _quote_search(deck_name)
+
+def deck_notes_query(deck_name, note_type=None):
+    """findNotes query for the notes directly in deck_name, optionally only those of note_type.
+
+    deck:"X" also matches the subdecks X::*, which are left out here, so tools that update or
+    delete "the deck's" notes never touch a subdeck or another note type.
+    """
+    query = f"{deck_query(deck_name)} -{deck_query(deck_name + '::*')}"
+    if note_type:
+        query += ' note:' + _quote_search(note_type)
+    return query
+
+_transport = None
+
+def get_transport():
+    """Return the process-wide AnkiTransport, creating it on first use."""
+    global _transport
+    if _transport is None:
+        _transport = AnkiTransport()
+    return _transport
+
+def iter_notes_info(note_ids, chunk_size=NOTES_INFO_CHUNK_SIZE, retries=2, transport=None):
+    """Yield notesInfo dicts for note_ids, fetched chunk_size notes per request.
+
+    Only one chunk's response is held in memory at a time. A failed chunk is retried on its
+    own (with a short backoff) up to retries times before RuntimeError is raised.
+    """
+    transport = transport or get_transport()
+    note_ids = list(note_ids)
+    for start in range(0, len(note_ids), chunk_size):
+        chunk = note_ids[start:start + chunk_size]
+        for attempt in range(retries + 1):
+            try:
+                notes_info = transport.request('notesInfo', {'notes': chunk}, timeout=60)
+                break
+            except (requests.RequestException, ValueError, RuntimeError) as e:
+                if attempt == retries:
+                    raise RuntimeError(f"notesInfo failed for notes {start + 1}-{start + len(chunk)} "
+                                       f"after {retries + 1} attempts: {e}")
+                print(f"notesInfo chunk {start + 1}-{start + len(chunk)} failed ({e}), retrying...")
+                time.sleep(attempt + 1)
+        for note_info in notes_info or []:
+            if note_info:
+                yield note_info
 
 def is_anki_running():
     try:
-        response = requests.post('http://localhost:8765', json={"action": "version", "version": 6}, timeout=1)
-        return response.status_code == 200
+        get_transport().invoke('version', timeout=1)
+        return True
     except Exception:
         return False
 
@@ -22,4 +260,28 @@ def ensure_anki_running():
                 return True
             time.sleep(1)
         return False
-    return True
\ No newline at end of file
+    return True
+
+def main():
+    """Print the on-disk AnkiConnect request log, e.g. to see which cards a failed batch lost.
+
+    Usage: python anki_utils.py [--failed] [--since MINUTES] [--action NAME]
+    """
+    since = action = None
+    try:
+        if '--since' in sys.argv:
+            since = time.time() - float(sys.argv[sys.argv.index('--since') + 1]) * 60
+        if '--action' in sys.argv:
+            action = sys.argv[sys.argv.index('--action') + 1]
+    except (IndexError, ValueError):
+        print("Usage: python anki_utils.py [--failed] [--since MINUTES] [--action NAME]", file=sys.stderr)
+        sys.exit(1)
+    entries = read_request_log(errors_only='--failed' in sys.argv, since=since, action=action)
+    print(f"AnkiConnect request log: {REQUEST_LOG_PATH} ({len(entries)} matching entries)")
+    for entry in entries:
+        logged = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.get('time', 0)))
+        outcome = f"ERROR {entry['error']}" if entry.get('error') else entry.get('result')
+        print(f"  {logged} {entry.get('action')}: {entry.get('params')} -> {outcome}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Card Generation
+Turns facts into Anki cards with the LLM for phone_auto_anki_maker.py and clipboard_to_anki.py.
+Facts are packed batch_size at a time into one request that asks for a strict JSON array of
+{"id", "front", "back"} objects, so a large backlog costs a few requests instead of one long
+prompt per fact. Each card is mapped back to its fact by id; a fact the batch reply does not
+cover falls back to the single-fact "Front: / Back:" prompt.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import llm_client
+from json_extract import find_json_arrays
+
+MODEL = 'deepseek-chat'
+BATCH_SIZE = 10
+CARD_TEMPLATE = 'anki-card-1'
+BATCH_TEMPLATE = 'anki-batch-1'
+CARD_PROMPT = "Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n"
+BATCH_PROMPT = ("Make one Anki Flashcard for each numbered fact below. You are free to use your own knowledge to make the cards more professional. "
+                "Respond with only a JSON array with one object per fact, in the same order, each of the form "
+                '{"id": <fact number>, "front": "...", "back": "..."}, and no other text.\n\n')
+
+def parse_card_response(response):
+    """Return (front, back) from a "Front: ... Back: ..." reply (plain or **bold** labels), or None."""
+    for front_label, back_label in (("**Front:**", "**Back:**"), ("Front: ", "Back: ")):
+        if front_label in response and back_label in response:
+            front, back = response.split(front_label, 1)[1].split(back_label, 1)
+            back = back.strip()
+            if "---" in back:
+                back = back.split("---", 1)[0]
+            elif "###" in back:
+                back = back.split("###", 1)[0]
+            front, back = front.strip(), back.strip()
+            return (front, back) if front and back else None
+    return None
+
+def parse_batch_response(response, count):
+    """Map a batch reply to {fact number (1-based): (front, back)}.
+
+    Uses the first JSON array of objects in the reply. Objects are matched on 'id'; if no
+    object has a usable id and the array has exactly count objects, they are matched by position.
+    Objects without a non-empty string front and back are left out.
+    """
+    items = next((array for array in find_json_arrays(response) if any(isinstance(item, dict) for item in array)), [])
+    items = [item for item in items if isinstance(item, dict)]
+    cards = {}
+    for item in items:
+        front, back = item.get('front'), item.get('back')
+        if not (isinstance(front, str) and isinstance(back, str) and front.strip() and back.strip()):
+            continue
+        try:
+            number = int(item.get('id'))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= number <= count and number not in cards:
+            cards[number] = (front.strip(), back.strip())
+    if not cards and len(items) == count:
+        for position, item in enumerate(items, 1):
+            front, back = item.get('front'), item.get('back')
+            if isinstance(front, str) and isinstance(back, str) and front.strip() and back.strip():
+                cards[position] = (front.strip(), back.strip())
+    return cards
+
+def _card_reply_ok(response):
+    return parse_card_response(response.replace("\n", "").strip()) is not None
+
+def generate_card(fact, use_cache=True):
+    """Generate one card with the single-fact prompt; return (front, back), or None on failure.
+
+    Fallbacks for facts a batch reply missed pass use_cache=False, so they always get a fresh reply.
+    """
+    try:
+        response = llm_client.complete([{"role": "user", "content": CARD_PROMPT + fact}], model=MODEL,
+                                       template=CARD_TEMPLATE, use_cache=use_cache, validate=_card_reply_ok)
+    except Exception as e:
+        print(f"LLM request failed for fact '{fact[:50]}...': {e}")
+        return None
+    card = parse_card_response(response.replace("\n", "").strip())
+    if card is None:
+        print(f"Could not parse Front/Back for fact '{fact[:50]}...': {response[:100]}")
+    return card
+
+def generate_batch(facts):
+    """Generate cards for facts in one request; return a list aligned with facts ((front, back) or None)."""
+    numbered = "\n".join(f"{number}. {' '.join(fact.split())}" for number, fact in enumerate(facts, 1))
+    try:
+        # A reply that misses some facts is not cached, so the batch is asked again next run
+        response = llm_client.complete([{"role": "user", "content": BATCH_PROMPT + numbered}], model=MODEL, template=BATCH_TEMPLATE,
+                                       validate=lambda reply: len(parse_batch_response(reply, len(facts))) == len(facts))
+    except Exception as e:
+        print(f"Batch LLM request for {len(facts)} facts failed: {e}")
+        return [None] * len(facts)
+    cards = parse_batch_response(response, len(facts))
+    if len(cards) < len(facts):
+        print(f"Batch reply covered {len(cards)} of {len(facts)} facts; the rest fall back to single requests")
+    return [cards.get(number) for number in range(1, len(facts) + 1)]
+
+def generate_cards(facts, batch_size=BATCH_SIZE, max_workers=1):
+    """Generate a card for every fact; return a list aligned with facts ((front, back) or None).
+
+    Facts are sent batch_size per request (batch_size 1, or a batch holding a single fact, uses
+    the single-fact prompt). Up to max_workers requests run at once. Facts missing from a batch
+    reply are retried with their own single-fact request, bypassing the cache.
+    """
+    batch_size = max(1, batch_size)
+    batches = [facts[start:start + batch_size] for start in range(0, len(facts), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        results = []
+        singles = set()
+        for batch, batch_cards in zip(batches, executor.map(lambda batch: generate_batch(batch) if len(batch) > 1 else [None], batches)):
+            if len(batch) == 1:
+                singles.add(len(results))
+            results.extend(batch_cards)
+        missing = [i for i, card in enumerate(results) if card is None]
+        for i, card in zip(missing, executor.map(lambda i: generate_card(facts[i], use_cache=i in singles), missing)):
+            results[i] = card
+    return results
@@ -3,7 +3,7 @@ import re
 import sys
 import os
 from AnkiConnector import AnkiConnector
-from openai import OpenAI
+import card_generation
 from anki_utils import ensure_anki_running
 
 def notify(text):
@@ -17,41 +17,12 @@ def notify(text):
     except Exception as e:
         print(f"[WARN] notify-send command failed: {e}")
 
-def send_request(request_message):
-    api_location = '~/Projects/grammarpt/deepseek_api.txt'
-    api_location = os.path.expanduser(api_location)
-    api_key = ""
-    try:
-        with open(api_location, 'r') as f:
-            api_key = f.read().strip()
-    except FileNotFoundError:
-        notify(f"ERROR: API key file not found at {api_location}")
-        return "ERROR: API Key file not found."
-    
-    if not api_key:
-        notify("ERROR: API key is empty.")
-        return "ERROR: API Key is empty."
-
-    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=request_message,
-            stream=False
-        )
-        corrected = response.choices[0].message.content.replace("\n","").strip().lstrip()
-    except Exception as e:
-        notify(f"ERROR: LLM API request failed: {e}")
-        return f"ERROR: LLM API request failed: {e}"
+def clipboard_to_anki(batch=False):
+    """Make an Anki card from the primary selection.
 
-    return corrected
-
-def construct_request(prompt, text):
-    item = prompt + text
-    return send_request([{"role":"user","content":item}])
-
-def clipboard_to_anki():
+    With batch=True (--batch), each blank-line-separated paragraph of the selection is its own
+    fact and the facts are sent to the LLM together.
+    """
     try:
         # Try using xclip to get the selected text
         try:
@@ -68,76 +39,50 @@ def clipboard_to_anki():
             notify("No text selected.")
             return
 
-        if not (10 < len(fact) < 1000):
-            notify(f"Fact length out of range (10-1000 chars). Current length: {len(fact)}")
-            return
+        if batch:
+            # Paragraphs separated by a blank line are separate facts, sent together in one batch request
+            facts = []
+            for paragraph in (paragraph.strip() for paragraph in fact.split('\n\n')):
+                if 10 < len(paragraph) < 1000:
+                    facts.append(paragraph)
+                elif paragraph:
+                    notify(f"Fact length out of range (10-1000 chars). Current length: {len(paragraph)}")
+            if not facts:
+                return
+        else:
+            if not (10 < len(fact) < 1000):
+                notify(f"Fact length out of range (10-1000 chars). Current length: {len(fact)}")
+                return
+            facts = [fact]
 
         # Notify user that processing has started
-        notify(f"Processing fact: {fact[:100]}{'...' if len(fact) > 100 else ''}")
-
-        # Use LLM to generate Anki card
-        anki_response = construct_request("Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n", fact)
-        
-        if anki_response.startswith("ERROR:"):
-            notify(f"LLM error: {anki_response}")
+        notify(f"Processing {len(facts)} fact(s): {fact[:100]}{'...' if len(fact) > 100 else ''}")
+
+        # Use LLM to generate Anki cards
+        cards = card_generation.generate_cards(facts)
+        for paragraph, card in zip(facts, cards):
+            if card is None:
+                notify(f"Could not extract valid Front/Back from LLM response for fact: {paragraph[:50]}...")
+        cards = [{'front': front, 'back': back, 'source': ""} for front, back in filter(None, cards)]
+        if not cards:
             return
 
-        front = None
-        back = None
-
-        # Parse the LLM response
-        if "**Front:**" in anki_response and "**Back:**" in anki_response:
-            try:
-                main_content = anki_response.split("**Front:**", 1)[1]
-                front_text_parts = main_content.split("**Back:**", 1)
-                front = front_text_parts[0].strip()
-                back_content = front_text_parts[1].strip()
-                if "---" in back_content: 
-                    back = back_content.split("---", 1)[0].strip()
-                elif "###" in back_content: 
-                    back = back_content.split("###", 1)[0].strip()
-                else: 
-                    back = back_content
-            except Exception as e:
-                notify(f"Error parsing MD Anki response: {e}")
-                return
-        elif "Front: " in anki_response and "Back: " in anki_response:
-            try:
-                main_content = anki_response.split("Front: ", 1)[1]
-                front_text_parts = main_content.split("Back: ", 1)
-                front = front_text_parts[0].strip()
-                back_content = front_text_parts[1].strip()
-                if "---" in back_content: 
-                    back = back_content.split("---", 1)[0].strip()
-                elif "###" in back_content: 
-                    back = back_content.split("###", 1)[0].strip()
-                else: 
-                    back = back_content
-            except Exception as e:
-                notify(f"Error parsing plain Anki response: {e}")
-                return
-        else:
-            notify(f"Could not parse Front/Back from LLM response: {anki_response[:100]}...")
+        # Create Anki cards
+        deck_name = '...MyDiscoveries2'
+        note_type = 'Basic'
+        if not ensure_anki_running():
+            notify("Could not start or connect to Anki. Please start Anki manually.")
             return
+        connector = AnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False)
 
-        if front and back:
-            # Create Anki card
-            deck_name = '...MyDiscoveries2'
-            note_type = 'Basic'
-            if not ensure_anki_running():
-                notify("Could not start or connect to Anki. Please start Anki manually.")
-                return
-            connector = AnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False)
-            
-            if connector.add_card(front, back, ""):
-                notify(f"Successfully created Anki card! Front: {front} | Back: {back}")
+        for card, result in zip(cards, connector.add_cards(cards)):
+            if result['note_id'] is not None:
+                notify(f"Successfully created Anki card! Front: {card['front']} | Back: {card['back']}")
             else:
-                notify(f"Failed to create Anki card. Front: {front} | Back: {back}")
-        else:
-            notify("Could not extract valid Front/Back from LLM response.")
+                notify(f"Failed to create Anki card. Front: {card['front']} | Back: {card['back']}")
 
     except Exception as e:
         notify(f"An error occurred: {e}")
 
 if __name__ == "__main__":
-    clipboard_to_anki()
\ No newline at end of file
+    clipboard_to_anki(batch='--batch' in sys.argv)
\ No newline at end of file
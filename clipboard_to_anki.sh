@@ -10,7 +10,7 @@ VENV_PATH="/home/twain/Projects/grammarpt/venv"
 source "/home/twain/Projects/grammarpt/venv/bin/activate"
 
 # Run the script
-/home/twain/Projects/grammarpt/venv/bin/python "$SCRIPT_PATH"
+/home/twain/Projects/grammarpt/venv/bin/python "$SCRIPT_PATH" "$@"
 
 # Deactivate the virtual environment
 deactivate
\ No newline at end of file
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+JSON Extractor
+Pulls JSON arrays of flashcards out of LLM transcripts: prose, ```json fenced blocks and
+several arrays in one reply are all handled, and brackets inside string literals are
+never mistaken for the end of an array.
+
+Extraction is one left-to-right pass: a regex search jumps to the next '[' that can start
+an array and the C JSON decoder (JSONDecoder.raw_decode) parses from there, so there is no
+per-character Python loop.
+Run 'python json_extract.py --benchmark [MB]' to time it on a synthetic transcript.
+"""
+
+import json
+import re
+import sys
+import time
+import unicodedata
+
+_decoder = json.JSONDecoder()
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+# '[' that can start a JSON array; prose like "[1]" still matches, "[see notes]" or "a[i]" does not.
+_ARRAY_START_RE = re.compile(r'\[\s*(?:[\[{"\-\d\]]|true|false|null)')
+# Candidates are decoded from a window of the text that doubles until the array fits, because a
+# JSONDecodeError counts the lines before its position, which would make failures O(len(text)) each.
+_DECODE_WINDOW = 4096
+# Strings (possibly unterminated) and brackets, for matching brackets where the decoder gives up.
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"?|[\[\]{}]', re.S)
+
+def _skip_unclosed(text, pos):
+    """Return where to resume scanning after the value at text[pos] nested too deeply or never closed.
+
+    Brackets outside strings are matched from pos: if the value closes, scanning resumes after it;
+    if the text ends first, it resumes at the first '[' inside the innermost container still open,
+    where an array that does close (e.g. one after a run of stray '[') can start.
+    """
+    open_at = []
+    for token in _TOKEN_RE.finditer(text, pos):
+        char = token.group()[0]
+        if char in '[{':
+            open_at.append(token.start())
+        elif char in ']}':
+            open_at.pop()
+            if not open_at:
+                return token.end()
+    for token in _TOKEN_RE.finditer(text, open_at[-1] + 1):
+        if token.group() == '[':
+            return token.start()
+    return len(text)
+
+def _decode_array(text, pos):
+    """Decode the JSON value starting at text[pos]; return (value, end), or (None, end) if it is not valid JSON."""
+    window = _DECODE_WINDOW
+    while True:
+        chunk = text[pos:pos + window]
+        try:
+            value, end = _decoder.raw_decode(chunk)
+            return value, pos + end
+        except json.JSONDecodeError as e:
+            # Errors at the end of the window, or an unterminated string, may just mean the window was too small
+            cut_off = e.pos >= len(chunk) - 8 or e.msg.startswith('Unterminated string')
+            if not cut_off:
+                return None, pos + max(e.pos, 1)
+            if pos + window >= len(text):
+                # The value runs to the end of the text (e.g. a truncated reply or stray '[')
+                return None, _skip_unclosed(text, pos)
+        except RecursionError:
+            # Pathologically deep nesting, e.g. a long run of '[' or a truncated '[1,[1,[1,...'.
+            # Every '[' inside would recurse again, so skip the value in one bracket-matching pass.
+            return None, _skip_unclosed(text, pos)
+        window *= 2
+
+def find_json_arrays(text):
+    """Return every top-level JSON array in text, in order of appearance.
+
+    A '[' that does not start valid JSON is skipped up to the point where decoding failed,
+    so each character is decoded at most once and the scan stays linear in len(text).
+    """
+    arrays = []
+    match = _ARRAY_START_RE.search(text)
+    while match:
+        value, end = _decode_array(text, match.start())
+        if value is not None:
+            arrays.append(value)
+        match = _ARRAY_START_RE.search(text, end)
+    return arrays
+
+def extract_cards(text):
+    """Return (cards, invalid) from all JSON arrays of objects in text.
+
+    cards are the objects with both 'front' and 'back'; an identical front/back pair repeated
+    in a later array is kept once. invalid are the other objects, for reporting.
+    """
+    cards = []
+    invalid = []
+    seen = set()
+    for array in find_json_arrays(text):
+        if not any(isinstance(item, dict) for item in array):
+            continue
+        for item in array:
+            if isinstance(item, dict) and "front" in item and "back" in item:
+                key = (str(item["front"]), str(item["back"]))
+                if key not in seen:
+                    seen.add(key)
+                    cards.append(item)
+            else:
+                invalid.append(item)
+    return cards, invalid
+
+def _drop_symbol(match):
+    char = match.group(0)
+    return '' if unicodedata.category(char).startswith('S') else char
+
+def strip_symbols(text):
+    """Remove emoji and other non-ASCII Unicode symbols (category S*), keeping letters and punctuation.
+
+    Only non-ASCII characters are looked up, so mostly-English text costs one regex scan.
+    """
+    return _NON_ASCII_RE.sub(_drop_symbol, text)
+
+def _benchmark_transcript(megabytes):
+    """Build a synthetic LLM transcript of roughly megabytes MB with prose, fences and tricky strings."""
+    card = {"front": "What does [x] mean in `a[i]`? 🤔", "back": "Index \"i\" of list a ] [ — see {braces}.", "source": "https://example.com/[1]"}
+    block = ("Here are the cards you asked for [draft 2]:\n\n```json\n" + json.dumps([card] * 20, indent=2, ensure_ascii=False)
+             + "\n```\n\nLet me know if you want more (see [notes] above).\n\n")
+    return block * max(1, int(megabytes * 1024 * 1024 / len(block.encode('utf-8'))))
+
+def benchmark(megabytes=8):
+    text = _benchmark_transcript(megabytes)
+    size_mb = len(text.encode('utf-8')) / (1024 * 1024)
+    print(f"Transcript: {size_mb:.1f} MB, {text.count('[')} '[' characters")
+    for name, func in (('find_json_arrays', find_json_arrays), ('strip_symbols', strip_symbols), ('extract_cards', extract_cards)):
+        started = time.perf_counter()
+        result = func(text)
+        elapsed = time.perf_counter() - started
+        count = f", {len(result)} arrays" if name == 'find_json_arrays' else ''
+        print(f"  {name}: {elapsed:.3f} s ({size_mb / elapsed:.1f} MB/s{count})")
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark':
+        benchmark(float(sys.argv[2]) if len(sys.argv) > 2 else 8)
+        return
+    if len(sys.argv) < 2:
+        print("Usage: python json_extract.py <file> | --benchmark [MB]")
+        sys.exit(1)
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        cards, invalid = extract_cards(f.read())
+    print(json.dumps(cards, indent=2, ensure_ascii=False))
+    print(f"{len(cards)} cards, {len(invalid)} invalid items", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
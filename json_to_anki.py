@@ -1,5 +1,4 @@
 import sys
-import json
 from PyQt5.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QLabel, QPushButton, QMessageBox
 )
@@ -7,6 +6,7 @@ from PyQt5.QtGui import QFont, QPalette, QColor
 from PyQt5.QtCore import Qt
 from AnkiConnector import AnkiConnector
 from anki_utils import ensure_anki_running
+from json_extract import extract_cards, strip_symbols
 
 class AnkiCardReviewer(QWidget):
     def __init__(self, cards):
@@ -119,71 +119,11 @@ def main():
         print("No JSON file provided.", file=sys.stderr)
         sys.exit(1)
     json_path = sys.argv[1]
-    import re
     with open(json_path, "r", encoding="utf-8") as f:
         text = f.read()
-    # Extract the first JSON array from the text, even if surrounded by other content
-    # First, try to remove markdown code block markers if present
-    cleaned_text = text
-    if '```json' in text and '```' in text:
-        # Extract content between ```json and ```
-        start_marker = text.find('```json')
-        if start_marker != -1:
-            start_content = start_marker + len('```json')
-            end_marker = text.find('```', start_content)
-            if end_marker != -1:
-                cleaned_text = text[start_content:end_marker].strip()
-    
-    # Remove emojis and other problematic Unicode characters
-    # Keep only printable ASCII characters, newlines, and common punctuation
-    import unicodedata
-    cleaned_chars = []
-    for char in cleaned_text:
-        # Keep ASCII printable characters, newlines, tabs, and spaces
-        if ord(char) < 128 or char in ['\n', '\r', '\t']:
-            cleaned_chars.append(char)
-        # Skip emojis and other Unicode symbols
-        elif unicodedata.category(char).startswith('S'):
-            continue
-        # Keep other characters that might be in JSON strings
-        else:
-            cleaned_chars.append(char)
-    
-    cleaned_text = ''.join(cleaned_chars)
-    
-    # Look for opening bracket, then find matching closing bracket
-    start_idx = cleaned_text.find('[')
-    if start_idx == -1:
-        print("No opening bracket '[' found in text.", file=sys.stderr)
-        sys.exit(1)
-    
-    # Find the matching closing bracket by counting brackets
-    bracket_count = 0
-    end_idx = -1
-    for i in range(start_idx, len(cleaned_text)):
-        if cleaned_text[i] == '[':
-            bracket_count += 1
-        elif cleaned_text[i] == ']':
-            bracket_count -= 1
-            if bracket_count == 0:
-                end_idx = i
-                break
-    
-    if end_idx == -1:
-        print("No matching closing bracket ']' found in text.", file=sys.stderr)
-        sys.exit(1)
-    
-    json_text = cleaned_text[start_idx:end_idx + 1]
-    match = type('Match', (), {'group': lambda self, n: json_text})()
-    if not match:
-        print("No JSON array found in file.", file=sys.stderr)
-        sys.exit(1)
-    try:
-        data = json.loads(match.group(0))
-    except Exception as e:
-        print(f"Failed to parse JSON array: {e}", file=sys.stderr)
-        sys.exit(1)
-    cards = [item for item in data if "front" in item and "back" in item]
+    # Remove emojis and other Unicode symbols, then pull every card array out of the text
+    # (fenced code blocks, surrounding prose and several arrays per reply are all fine)
+    cards, _ = extract_cards(strip_symbols(text))
     if not cards:
         print("No valid cards found in JSON.", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+LLM Response Cache
+SQLite cache of chat completions keyed by (model, prompt template version, normalized input),
+so a fact re-queued after a partial failure or a paragraph checked twice is answered from disk
+in milliseconds instead of spending API quota. Entries unused for max_age_days are dropped and
+the least recently used entries are evicted once the cache grows past max_bytes.
+
+Set GRAMMARPT_NO_LLM_CACHE=1 (or pass use_cache=False to llm_client.complete) to bypass it.
+Run 'python llm_cache.py' for hit/miss statistics, or 'python llm_cache.py --clear' to empty it.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+CACHE_PATH = os.path.expanduser('~/.cache/grammarpt/llm_cache.sqlite3')
+MAX_BYTES = 20_000_000
+MAX_AGE_DAYS = 30
+BYPASS_ENV = 'GRAMMARPT_NO_LLM_CACHE'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    template TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+'''
+
+def normalize_text(text):
+    """Normalize message text for the cache key: unify line endings and drop trailing and surrounding whitespace.
+
+    Case and indentation are kept, since grammar fixes and code prompts depend on them.
+    """
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(line.rstrip() for line in lines).strip()
+
+def cache_key(model, template, messages, params=None):
+    """Hex digest identifying one request: model, template version, normalized messages and extra params."""
+    normalized = [{'role': message.get('role'), 'content': normalize_text(str(message.get('content', '')))}
+                  for message in messages]
+    payload = json.dumps([model, template or '', normalized, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+
+def cache_disabled():
+    return os.environ.get(BYPASS_ENV, '') not in ('', '0')
+
+class ResponseCache:
+    """On-disk LRU cache of LLM responses, safe to share between threads."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES, max_age_days=MAX_AGE_DAYS):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self.db.close()
+
+    def get(self, key):
+        """Return the cached response for key, or None; counts a hit or a miss."""
+        with self.lock:
+            row = self.db.execute('SELECT response, last_used FROM responses WHERE key = ?', (key,)).fetchone()
+            now = time.time()
+            if row and now - row[1] > self.max_age:
+                row = None
+            with self.db:
+                if row:
+                    self.hits += 1
+                    self.db.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+                else:
+                    self.misses += 1
+                self._count('hits' if row else 'misses')
+        return row[0] if row else None
+
+    def put(self, key, model, template, response):
+        """Store response under key, then evict expired and least recently used entries."""
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO responses (key, model, template, response, size, created, last_used) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?)', (key, model, template or '', response, size, now, now))
+            self._evict(now)
+
+    def _count(self, name):
+        self.db.execute('INSERT INTO counters (name, value) VALUES (?, 1) '
+                        'ON CONFLICT(name) DO UPDATE SET value = value + 1', (name,))
+
+    def _evict(self, now):
+        self.db.execute('DELETE FROM responses WHERE last_used < ?', (now - self.max_age,))
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict = []
+        for key, size in self.db.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if total <= self.max_bytes:
+                break
+            evict.append((key,))
+            total -= size
+        self.db.executemany('DELETE FROM responses WHERE key = ?', evict)
+
+    def stats(self):
+        """Return {'entries', 'bytes', 'hits', 'misses'}; hits and misses are totals across runs."""
+        with self.lock:
+            entries, size = self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            counters = dict(self.db.execute('SELECT name, value FROM counters'))
+        return {'entries': entries, 'bytes': size, 'hits': counters.get('hits', 0), 'misses': counters.get('misses', 0)}
+
+    def clear(self):
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM responses')
+            self.db.execute('DELETE FROM counters')
+
+_cache = None
+
+def get_cache():
+    """Return the process-wide ResponseCache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
+
+def main():
+    """Main function."""
+    cache = get_cache()
+    if '--clear' in sys.argv:
+        cache.clear()
+        print(f"Cleared LLM response cache ({CACHE_PATH})")
+        return
+    stats = cache.stats()
+    lookups = stats['hits'] + stats['misses']
+    print(f"LLM response cache: {CACHE_PATH}")
+    print(f"  Entries: {stats['entries']} ({stats['bytes'] / 1_000_000:.1f} MB of {MAX_BYTES / 1_000_000:.0f} MB)")
+    print(f"  Hits: {stats['hits']}")
+    print(f"  Misses: {stats['misses']}")
+    if lookups:
+        print(f"  Hit rate: {stats['hits'] / lookups:.0%}")
+
+if __name__ == "__main__":
+    main()
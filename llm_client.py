@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+LLM Client
+Shared chat-completion layer for the grammar, clipboard and phone scripts. API keys are read
+from disk once per process and each provider gets one client, reused for every request, so
+its pooled keep-alive connection skips the TLS handshake after the first call.
+
+Replies are cached on disk (see llm_cache.py), so a repeated request costs no API call.
+astream_answer streams a reply, dropping <think> reasoning blocks as they arrive.
+
+The provider SDKs (groq, openai) are imported when a provider is first used, so a script only
+needs the SDK of the models it calls.
+"""
+
+import asyncio
+import os
+import time
+from llm_cache import cache_disabled, cache_key, get_cache
+
+PROVIDERS = {
+    'groq': {'key_path': '~/Projects/grammarpt/groq_apikey.txt', 'base_url': None},
+    'deepseek': {'key_path': '~/Projects/grammarpt/deepseek_api.txt', 'base_url': 'https://api.deepseek.com'},
+}
+MODEL_PROVIDERS = {
+    'deepseek-chat': 'deepseek',
+    'deepseek-reasoner': 'deepseek',
+    'deepseek-r1-distill-llama-70b': 'groq',
+}
+DEFAULT_MODEL = 'deepseek-chat'
+REQUEST_TIMEOUT = 60  # seconds
+
+_api_keys = {}
+_clients = {}
+_async_clients = {}
+
+def provider_for(model):
+    """Return the provider name serving model; raise ValueError for an unknown model."""
+    try:
+        return MODEL_PROVIDERS[model]
+    except KeyError:
+        raise ValueError(f"Unknown model '{model}' (known: {', '.join(sorted(MODEL_PROVIDERS))})")
+
+def get_api_key(provider):
+    """Return the provider's API key, read from its key file on first use.
+
+    Raises RuntimeError if the file is missing or empty.
+    """
+    if provider not in _api_keys:
+        path = os.path.expanduser(PROVIDERS[provider]['key_path'])
+        try:
+            with open(path, 'r') as f:
+                api_key = f.read().strip()
+        except FileNotFoundError:
+            raise RuntimeError(f"API key file not found at {path}")
+        if not api_key:
+            raise RuntimeError(f"API key file is empty: {path}")
+        _api_keys[provider] = api_key
+    return _api_keys[provider]
+
+def _client_class(provider, use_async):
+    if provider == 'groq':
+        from groq import AsyncGroq, Groq
+        return AsyncGroq if use_async else Groq
+    from openai import AsyncOpenAI, OpenAI
+    return AsyncOpenAI if use_async else OpenAI
+
+def _new_client(provider, use_async):
+    kwargs = {'api_key': get_api_key(provider), 'timeout': REQUEST_TIMEOUT}
+    if PROVIDERS[provider]['base_url']:
+        kwargs['base_url'] = PROVIDERS[provider]['base_url']
+    return _client_class(provider, use_async)(**kwargs)
+
+def get_client(provider):
+    """Return the process-wide synchronous client for provider, creating it on first use."""
+    if provider not in _clients:
+        _clients[provider] = _new_client(provider, use_async=False)
+    return _clients[provider]
+
+def get_async_client(provider):
+    """Return the async client for provider in the running event loop, creating it on first use.
+
+    Async clients are kept per event loop because their connection pool is bound to the loop
+    that first used it.
+    """
+    key = (provider, asyncio.get_running_loop())
+    if key not in _async_clients:
+        _async_clients[key] = _new_client(provider, use_async=True)
+    return _async_clients[key]
+
+def _cached(messages, model, template, use_cache, kwargs):
+    """Return (key, cached reply or None); key is None when the cache is bypassed."""
+    if not use_cache or cache_disabled():
+        return None, None
+    key = cache_key(model, template, messages, kwargs)
+    return key, get_cache().get(key)
+
+def _store(key, model, template, reply, validate=None):
+    """Cache reply under key unless it is empty or validate rejects it; return reply."""
+    if key and reply and (validate is None or validate(reply)):
+        get_cache().put(key, model, template, reply)
+    return reply
+
+def complete(messages, model=DEFAULT_MODEL, template=None, use_cache=True, validate=None, **kwargs):
+    """Send a chat completion request and return the reply text.
+
+    template is a version label for the prompt (e.g. 'anki-card-1'); bump it when a prompt or
+    the parsing of its reply changes so old cached replies are not reused. use_cache=False
+    always asks the provider. validate(reply) -> bool decides whether a fresh reply is usable;
+    only usable replies are cached, so a reply the caller cannot parse is asked for again on
+    the next run instead of being replayed. Extra keyword arguments (temperature, max_tokens,
+    ...) are passed to the provider. Raises RuntimeError for credential problems and the SDK's
+    exceptions for failed requests.
+    """
+    key, reply = _cached(messages, model, template, use_cache, kwargs)
+    if reply is not None:
+        return reply
+    response = get_client(provider_for(model)).chat.completions.create(model=model, messages=messages, **kwargs)
+    return _store(key, model, template, response.choices[0].message.content, validate)
+
+async def acomplete(messages, model=DEFAULT_MODEL, template=None, use_cache=True, validate=None, **kwargs):
+    """Async version of complete."""
+    key, reply = _cached(messages, model, template, use_cache, kwargs)
+    if reply is not None:
+        return reply
+    client = get_async_client(provider_for(model))
+    response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+    return _store(key, model, template, response.choices[0].message.content, validate)
+
+THINK_OPEN = '<think>'
+THINK_CLOSE = '</think>'
+
+def _partial_tag(text, tag):
+    """Length of the longest suffix of text that is a proper prefix of tag (a tag cut off mid-stream)."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if text.endswith(tag[:size]):
+            return size
+    return 0
+
+class ThinkFilter:
+    """Removes <think>...</think> blocks from text that arrives in pieces.
+
+    feed() returns the visible text of each piece, holding back a possible tag cut off at the
+    end. answer_done becomes True when a new <think> block opens after visible text, i.e. the
+    answer is complete and only trailing reasoning follows.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.in_think = False
+        self.answer_started = False
+        self.answer_done = False
+
+    def feed(self, text):
+        self.buffer += text
+        visible = []
+        while self.buffer and not self.answer_done:
+            if self.in_think:
+                end = self.buffer.find(THINK_CLOSE)
+                if end == -1:
+                    self.buffer = self.buffer[len(self.buffer) - _partial_tag(self.buffer, THINK_CLOSE):]
+                    break
+                self.buffer = self.buffer[end + len(THINK_CLOSE):]
+                self.in_think = False
+                continue
+            start = self.buffer.find(THINK_OPEN)
+            if start == -1:
+                cut = len(self.buffer) - _partial_tag(self.buffer, THINK_OPEN)
+                visible.append(self.buffer[:cut])
+                self.buffer = self.buffer[cut:]
+                break
+            visible.append(self.buffer[:start])
+            self.buffer = self.buffer[start + len(THINK_OPEN):]
+            if self.answer_started or ''.join(visible).strip():
+                self.answer_done = True
+            self.in_think = True
+        text = ''.join(visible)
+        if text.strip():
+            self.answer_started = True
+        return text
+
+    def flush(self):
+        """Return the text held back when the stream ends (nothing if it ended inside a <think> block)."""
+        text = '' if self.in_think or self.answer_done else self.buffer
+        self.buffer = ''
+        return text
+
+async def astream_answer(messages, model=DEFAULT_MODEL, template=None, use_cache=True, **kwargs):
+    """Stream a chat completion and return (answer, timings) as soon as the answer is complete.
+
+    <think> blocks are dropped as the tokens arrive, and if reasoning starts again after the
+    answer the stream is closed instead of waiting for it. timings has 'first_token',
+    'first_answer_token' and 'total', in seconds since the call (None if that never happened).
+    The cache is shared with complete(): a hit returns at once, and the raw text received up
+    to the end of the answer is stored if it contains an answer.
+    """
+    started = time.monotonic()
+    timings = {'first_token': None, 'first_answer_token': None, 'total': None}
+    think = ThinkFilter()
+    key, reply = _cached(messages, model, template, use_cache, kwargs)
+    if reply is not None:
+        answer = think.feed(reply) + think.flush()
+        timings['first_token'] = timings['first_answer_token'] = timings['total'] = time.monotonic() - started
+        return answer, timings
+
+    client = get_async_client(provider_for(model))
+    stream = await client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    raw = []
+    answer = []
+    try:
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            elapsed = time.monotonic() - started
+            if timings['first_token'] is None:
+                timings['first_token'] = elapsed
+            raw.append(delta)
+            visible = think.feed(delta)
+            if visible.strip() and timings['first_answer_token'] is None:
+                timings['first_answer_token'] = elapsed
+            answer.append(visible)
+            if think.answer_done:
+                break
+    finally:
+        await stream.close()
+    answer.append(think.flush())
+    answer = ''.join(answer)
+    if answer.strip():
+        _store(key, model, template, ''.join(raw))
+    timings['total'] = time.monotonic() - started
+    return answer, timings
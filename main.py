@@ -2,13 +2,15 @@ from subprocess import Popen, PIPE
 import os
 #import openai
 import subprocess
-from AnkiConnector import AnkiConnector
+from AsyncAnkiConnector import AsyncAnkiConnector
 import time
 from PIL import Image
 import glob
+import asyncio
 import pyautogui
 import pyperclip
-from groq import AsyncGroq as Groq
+import llm_client
+import llm_cache
 
 #to use this, make a custom keyboard shortcut for each language:
 #bash -c "python3 /home/[USERNAME]/Projects/grammarpt/main.py -[ARGUMENT]"
@@ -23,6 +25,8 @@ def get_args():
     parser.add_argument('-f', '--create_function', action='store_true', help='creates a function from selected code')
     parser.add_argument('-a', '--makeanki', action='store_true', help='make an anki card from selected text')
     parser.add_argument('-m', '--makeankiimage', action='store_true', help='make an anki card from selected text and last screenshotted image')
+    parser.add_argument('-s', '--stream', action='store_true', help='stream the reply for -g, -i, -c and -f and paste as soon as the answer is complete')
+    parser.add_argument('--no-cache', action='store_true', help='always ask the LLM instead of reusing a cached reply')
     return parser.parse_args()
 
 def get_active_window():
@@ -58,9 +62,16 @@ def notify(text):
     msg = "notify-send ' ' '"+text+"'"
     os.system(msg)
 
-async def construct_request(prompt, text):
+async def construct_request(prompt, text, template=None, stream=False, validate=None):
     item = prompt+text
-    return await send_request([{"role":"user","content":item}])
+    if stream:
+        return await send_streaming_request([{"role":"user","content":item}], template)
+    return await send_request([{"role":"user","content":item}], template, validate)
+
+def is_anki_card_reply(response):
+    """True if response splits into front and back the way the -a/-m handlers read it."""
+    segments = response.replace("\n","").split("Front: ")
+    return len(segments) > 1 and len(segments[1].split("Back: ")) == 2
 
 def send_openai_request(request_message):
     api_location = '~/Projects/grammarpt/apikey.txt'
@@ -77,26 +88,28 @@ def send_openai_request(request_message):
     pyperclip.copy(corrected)    
     return corrected
 
-async def send_request(request_message):
-    api_location = '~/Projects/grammarpt/groq_apikey.txt'
-    api_location = os.path.expanduser(api_location)
-    with open(api_location, 'r') as f:
-        api_key = f.read().strip()
-    
-    client = Groq(api_key=api_key)
-    
-    response = await client.chat.completions.create(
-        messages=request_message,
-        model="deepseek-r1-distill-llama-70b"
-    )                   
-    
-    corrected = response.choices[0].message.content.replace("\n","").strip().lstrip()
+async def send_request(request_message, template=None, validate=None):
+    response = await llm_client.acomplete(request_message, model="deepseek-r1-distill-llama-70b", template=template, validate=validate)
+    corrected = response.replace("\n","").strip().lstrip()
+    notify(corrected)
+    pyperclip.copy(corrected)
+    print(corrected)
+    return corrected
+
+async def send_streaming_request(request_message, template=None):
+    """Like send_request, but streams the reply: <think> blocks are dropped as they arrive and the
+    answer is copied as soon as it is complete, without waiting for any trailing reasoning."""
+    response, timings = await llm_client.astream_answer(request_message, model="deepseek-r1-distill-llama-70b", template=template)
+    if timings['first_token'] is not None:
+        print(f"Time to first token: {timings['first_token']:.2f}s, first answer token: "
+              f"{timings['first_answer_token'] or 0:.2f}s, answer complete: {timings['total']:.2f}s")
+    corrected = response.replace("\n","").strip().lstrip()
     notify(corrected)
     pyperclip.copy(corrected)
     print(corrected)
     return corrected
 
-async def coding_assistant(notification, prompt):
+async def coding_assistant(notification, prompt, template=None, stream=False):
     selected_text = get_primary_clipboard()
     if len(selected_text) < 5000:
         notify(notification)
@@ -104,7 +117,7 @@ async def coding_assistant(notification, prompt):
         first_line = selected_text.split('\n')[0]
         indentation = first_line[:len(first_line) - len(first_line.lstrip())]
         pre_text = '\n'.join([line[:len(line) - len(line.lstrip())] + '#' + line.lstrip() for line in selected_text.split('\n')]) + '\n'
-        await construct_request(prompt+"\n\n", selected_text)
+        await construct_request(prompt+"\n\n", selected_text, template, stream)
         current_clipboard = pyperclip.paste()
         # Indent the lines in current_clipboard with the same indentation as the original selected text
         current_clipboard_indented = '\n'.join([indentation + line for line in current_clipboard.split('\n')])
@@ -113,7 +126,7 @@ async def coding_assistant(notification, prompt):
     else:
         notify("Too long for highlight grammar fix. Break it into small parts")
 
-async def coding_assistant_new(notification, prompt):
+async def coding_assistant_new(notification, prompt, template=None, stream=False):
     selected_text = get_primary_clipboard()
     if len(selected_text) < 5000:
         notify(notification)
@@ -121,7 +134,7 @@ async def coding_assistant_new(notification, prompt):
         first_line = selected_text.split('\n')[0]
         indentation = first_line[:len(first_line) - len(first_line.lstrip())]
         pre_text = '\n'.join([line[:len(line) - len(line.lstrip())] + '#' + line.lstrip() for line in selected_text.split('\n')]) + '\n'
-        await construct_request(prompt+"\n\n", selected_text)
+        await construct_request(prompt+"\n\n", selected_text, template, stream)
         current_clipboard = pyperclip.paste()
         # Indent the lines in current_clipboard with the same indentation as the original selected text
         current_clipboard_indented = '\n'.join([indentation + line for line in current_clipboard.split('\n')])
@@ -139,6 +152,8 @@ def replace_spaces(text):
 
 async def main():
     args = get_args()
+    if args.no_cache:
+        os.environ[llm_cache.BYPASS_ENV] = '1'
     if args.obsidian_inbox:
         notify("Appended to obsidian inbox")
         selected_text = get_primary_clipboard()
@@ -153,7 +168,7 @@ async def main():
         pyautogui.hotkey('ctrl', 'a')
         selected_text = get_primary_clipboard()
         if len(selected_text) < 1000:
-            await construct_request("Fix the grammar, only respond with the corrected text.\n\n", selected_text.replace("\n", " ").strip().lstrip())
+            await construct_request("Fix the grammar, only respond with the corrected text.\n\n", selected_text.replace("\n", " ").strip().lstrip(), "grammar-1", args.stream)
             pyautogui.hotkey('ctrl', 'v')
         else:
             notify("Too long for auto grammar fix. Use grammar highlight.")
@@ -161,28 +176,29 @@ async def main():
     if args.grammaarhighlight:
         selected_text = get_primary_clipboard()
         if len(selected_text) < 10000:
-            await construct_request("Fix the grammar, only respond with the corrected text.\n\n", selected_text.replace("\n", " ").strip().lstrip())
+            await construct_request("Fix the grammar, only respond with the corrected text.\n\n", selected_text.replace("\n", " ").strip().lstrip(), "grammar-1", args.stream)
         else:
             notify("Too long for highlight grammar fix. Break it into small parts")
     if args.codecondense:
-        await coding_assistant("Condensing code...", "Condense this code, only respond with the condensed code.")
+        await coding_assistant("Condensing code...", "Condense this code, only respond with the condensed code.", "condense-1", args.stream)
     if args.create_function:
-        await coding_assistant_new("Creating function...", "Create a function for this code, only respond with the function, exclude imports.")
+        await coding_assistant_new("Creating function...", "Create a function for this code, only respond with the function, exclude imports.", "function-1", args.stream)
     if args.makeanki:
         #selected_text = get_primary_clipboard()
         selected_text = "dogs are usually bigger than cats"
         if len(selected_text) < 1000:
             notify("Making Anki card...")
-            anki_response = await construct_request("Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n", selected_text)
+            anki_response = await construct_request("Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n", selected_text, "anki-card-1", validate=is_anki_card_reply)
             parts = anki_response.split("Front: ")[1].split("Back: ")
             front, back = [part.strip() for part in parts]
-            url = get_firefox_url()
+            url = await asyncio.to_thread(get_firefox_url)
             source = url if url else ""
             source = '' if 'Front: ' in source else source
             deck_name = '...MyDiscoveries'
             note_type = 'Basic'
-            connector = AnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False)
-            connector.add_card(front, back, source)
+            async with AsyncAnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False) as connector:
+                # Let the Anki write overlap with the desktop notification
+                await asyncio.gather(connector.add_card(front, back, source, verify=False), asyncio.to_thread(notify, "Sending card to Anki..."))
         else:
             notify("Too long for highlight grammar fix. Break it into small parts")
     if args.makeankiimage:
@@ -198,21 +214,21 @@ async def main():
         selected_text = get_primary_clipboard()
         if len(selected_text) < 1000:
             notify("Making Anki card with an image...")
-            anki_response = await construct_request("Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n", selected_text)
+            anki_response = await construct_request("Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n", selected_text, "anki-card-1", validate=is_anki_card_reply)
             parts = anki_response.split("Front: ")[1].split("Back: ")
             front, back = [part.strip() for part in parts]
-            url = get_firefox_url()
+            url = await asyncio.to_thread(get_firefox_url)
             source = url if url else ""
             source = '' if 'Front: ' in source else source
             deck_name = '...MyDiscoveries'
             note_type = 'Basic'
-            connector = AnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False, back_image=new_file_name)
-            connector.add_card(front, back, source)
+            async with AsyncAnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False, back_image=new_file_name) as connector:
+                # Let the Anki write overlap with the desktop notification
+                await asyncio.gather(connector.add_card(front, back, source, verify=False), asyncio.to_thread(notify, "Sending card with image to Anki..."))
         else:
             notify("Too long for highlight grammar fix. Break it into small parts")
 
 if __name__ == "__main__":
-    import asyncio
     asyncio.run(main())
 
 
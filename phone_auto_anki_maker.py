@@ -11,9 +11,8 @@ except Exception as e:
 
 from subprocess import Popen, PIPE
 # import os # Already imported
-import openai
-from openai import OpenAI
 import subprocess
+import card_generation
 from AnkiConnector import AnkiConnector
 import time
 # from PIL import Image # Not currently used, can be removed if not planned
@@ -54,51 +53,29 @@ def notify(text):
     except Exception as e:
         print(f"[WARN] notify-send command failed: {e}")
 
-def construct_request(prompt, text):
-    item = prompt+text
-    return send_request([{"role":"user","content":item}])
-
-def send_request(request_message):
-    api_location = '~/Projects/grammarpt/deepseek_api.txt'
-    api_location = os.path.expanduser(api_location)
-    api_key = ""
-    try:
-        with open(api_location, 'r') as f:
-            api_key = f.read().strip()
-    except FileNotFoundError:
-        notify(f"ERROR: API key file not found at {api_location}")
-        return "ERROR: API Key file not found."
-    
-    if not api_key:
-        notify("ERROR: API key is empty.")
-        return "ERROR: API Key is empty."
-
-    client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
-
-    try:
-        response = client.chat.completions.create(
-            model="deepseek-chat",
-            messages=request_message,
-            stream=False
-        )
-        corrected = response.choices[0].message.content.replace("\n","").strip().lstrip()
-    except Exception as e:
-        notify(f"ERROR: LLM API request failed: {e}")
-        return f"ERROR: LLM API request failed: {e}"
+ankti_to_make_location = '/home/twain/noteVault/tail/ankis_to_make.txt'
+LLM_CONCURRENCY = int(os.environ.get('PHONE_ANKI_CONCURRENCY', 4)) # LLM requests sent at the same time
+BATCH_SIZE = int(os.environ.get('PHONE_ANKI_BATCH_SIZE', card_generation.BATCH_SIZE)) # Facts per LLM request; 1 sends each fact on its own
 
-    notify(f"LLM Response: {corrected}") # For logging what LLM sent before clipboard
-    
+def copy_to_clipboard(text):
     if PYPERCLIP_AVAILABLE:
         try:
-            pyperclip.copy(corrected)
-            print("[INFO] Copied LLM response to clipboard.")
+            pyperclip.copy(text)
+            print("[INFO] Copied generated cards to clipboard.")
         except Exception as e: # Catches pyperclip.PyperclipException and others
             print(f"[WARN] pyperclip.copy() failed: {e}. Skipping clipboard operation.")
     else:
         print("[INFO] pyperclip not available, skipping clipboard operation.")
-    return corrected
 
-ankti_to_make_location = '/home/twain/noteVault/tail/ankis_to_make.txt'
+def parse_chunk(chunk):
+    """Split a chunk ("fact" or "fact | url") into (fact, source_url); a bare domain gets http://."""
+    if '|' in chunk:
+        fact, url = (part.strip() for part in chunk.split('|', 1))
+    else:
+        fact, url = chunk.strip(), ""
+    if url and not url.startswith('http://') and not url.startswith('https://'):
+        url = 'http://'+url
+    return fact, url
 
 def main_processing():
     global card_creation_failed # Allow modification of global
@@ -123,79 +100,48 @@ def main_processing():
         chunks = content.split('\n\n')
         processed_content = True # Mark that we are attempting to process
 
+    facts = []
+    sources = []
     for chunk_idx, chunk in enumerate(chunks):
         if not chunk.strip():
             print(f"Skipping empty chunk {chunk_idx + 1}/{len(chunks)}.")
             continue
-        
-        print(f"Processing chunk {chunk_idx + 1}/{len(chunks)}: '{chunk[:70]}...'")
-        fact = ""
-        url = ""
-        if '|' in chunk:
-            parts = chunk.split('|', 1)
-            fact = parts[0].strip()
-            url = parts[1].strip() if len(parts) > 1 else ""
-        else:
-            fact = chunk.strip()
-            url = ""
-
+        fact, source_url = parse_chunk(chunk)
         if not (10 < len(fact) < 1000):
             notify(f"Fact length out of range (10-1000 chars) for chunk: '{fact[:70]}...'. Skipping.")
             card_creation_failed = True # Consider this a failure to prevent clearing if other cards succeed
             continue
-
-        anki_response = construct_request("Make an Anki Flashcard from the following fact. You are free to use your own knowledge to make the card more professional. Label it Front: and Back: .\n\n", fact)
-        
-        if anki_response.startswith("ERROR:"): # Check for errors from send_request
-            notify(f"Skipping card creation due to LLM error for fact: {fact[:50]}...")
+        facts.append(fact)
+        sources.append(source_url)
+
+    # Facts go to the LLM BATCH_SIZE per request, at most LLM_CONCURRENCY requests at a time;
+    # the results come back in fact order, so the cards and the report below are deterministic
+    print(f"Generating cards for {len(facts)} fact(s), {BATCH_SIZE} per request...")
+    pending_cards = [] # Added to Anki in one batch below
+    card_texts = []
+    for fact, source_url, card in zip(facts, sources, card_generation.generate_cards(facts, BATCH_SIZE, LLM_CONCURRENCY)):
+        if card is None:
+            notify(f"Could not generate a card for fact: {fact[:50]}...")
             card_creation_failed = True
-            continue
-
-        front = None
-        back = None
-
-        if "**Front:**" in anki_response and "**Back:**" in anki_response:
-            try:
-                main_content = anki_response.split("**Front:**", 1)[1]
-                front_text_parts = main_content.split("**Back:**", 1)
-                front = front_text_parts[0].strip()
-                back_content = front_text_parts[1].strip()
-                if "---" in back_content: back = back_content.split("---", 1)[0].strip()
-                elif "###" in back_content: back = back_content.split("###", 1)[0].strip()
-                else: back = back_content
-            except Exception as e:
-                notify(f"Error parsing MD Anki response for fact '{fact[:50]}...': {e}")
-                card_creation_failed = True
-        elif "Front: " in anki_response and "Back: " in anki_response:
-            try:
-                main_content = anki_response.split("Front: ", 1)[1]
-                front_text_parts = main_content.split("Back: ", 1)
-                front = front_text_parts[0].strip()
-                back_content = front_text_parts[1].strip()
-                if "---" in back_content: back = back_content.split("---", 1)[0].strip()
-                elif "###" in back_content: back = back_content.split("###", 1)[0].strip()
-                else: back = back_content
-            except Exception as e:
-                notify(f"Error parsing plain Anki response for fact '{fact[:50]}...': {e}")
-                card_creation_failed = True
-        
-        if front and back:
-            source_url = url if url else ""
-            if source_url and not source_url.startswith('http://') and not source_url.startswith('https://'):
-                source_url = 'http://'+source_url
-            
-            deck_name = '...MyDiscoveries2'
-            note_type = 'Basic'
-            print(f"Attempting to add card to Anki. Deck: '{deck_name}', Front: '{front[:50]}...'")
-            connector = AnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False)
-            if not connector.add_card(front, back, source_url):
+        else:
+            card_texts.append(f"Front: {card[0]} Back: {card[1]}")
+            notify(f"LLM Response: {card_texts[-1]}") # For logging what the LLM sent before clipboard
+            pending_cards.append({'front': card[0], 'back': card[1], 'source': source_url, 'fact': fact})
+    if card_texts:
+        copy_to_clipboard("\n\n".join(card_texts))
+
+    if pending_cards:
+        deck_name = '...MyDiscoveries2'
+        note_type = 'Basic'
+        print(f"Attempting to add {len(pending_cards)} card(s) to Anki. Deck: '{deck_name}'")
+        connector = AnkiConnector(deck_name=deck_name, note_type=note_type, allow_duplicate=False)
+        results = connector.add_cards(pending_cards)
+        for card, result in zip(pending_cards, results):
+            if result['note_id'] is None:
                 card_creation_failed = True
-                notify(f"Failed to add card via AnkiConnect for fact: {fact[:50]}...")
+                notify(f"Failed to add card via AnkiConnect for fact: {card['fact'][:50]}... ({result['error']})")
             else:
-                notify(f"Successfully added card for fact: {fact[:50]}...")
-        else:
-            notify(f"Could not parse Front/Back from Anki response for fact: {fact[:50]}... Response: {anki_response[:100]}")
-            card_creation_failed = True
+                notify(f"Successfully added card for fact: {card['fact'][:50]}...")
 
     if processed_content and not card_creation_failed:
         try: